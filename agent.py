@@ -1,3 +1,5 @@
+import graph
+
 import hashlib
 import math
 import random
@@ -18,28 +20,28 @@ class Agent:
 
         self.age = 0
         self.influenced = True if self.influencer == True else False
-        self.neighbors = []
         self.nextInfluenced = False
-        self.scaleFreeNeighbors = []
-        self.smallWorldNeighbors = []
         self.timestepInfluenced = -1
 
     def doInfluence(self):
-        if len(self.neighbors) == 0:
+        network = self.trendemic.graph
+        # Threshold model is monotone, so influenced agents never need to be reevaluated
+        if self.influenced == True or network.degree(self.ID) == 0:
             return
-        fractionInfluenced = 0
         scaleFreeFractionInfluenced = 0
         smallWorldFractionInfluenced = 0
-        for neighbor in self.neighbors:
-            if neighbor.influenced == True:
-                fractionInfluenced += 1
-                if neighbor in self.scaleFreeNeighbors:
+        agents = self.trendemic.agents
+        for (neighborID, layer) in network.edges(self.ID):
+            if agents[neighborID].influenced == True:
+                if layer & graph.SCALE_FREE:
                     scaleFreeFractionInfluenced += 1
-                if neighbor in self.smallWorldNeighbors:
+                if layer & graph.SMALL_WORLD:
                     smallWorldFractionInfluenced += 1
 
-        scaleFreeFractionInfluenced = scaleFreeFractionInfluenced / len(self.scaleFreeNeighbors) if len(self.scaleFreeNeighbors) > 0 else 0
-        smallWorldFractionInfluenced = smallWorldFractionInfluenced / len(self.smallWorldNeighbors) if len(self.smallWorldNeighbors) > 0 else 0
+        scaleFreeDegree = network.degree(self.ID, graph.SCALE_FREE)
+        smallWorldDegree = network.degree(self.ID, graph.SMALL_WORLD)
+        scaleFreeFractionInfluenced = scaleFreeFractionInfluenced / scaleFreeDegree if scaleFreeDegree > 0 else 0
+        smallWorldFractionInfluenced = smallWorldFractionInfluenced / smallWorldDegree if smallWorldDegree > 0 else 0
         fractionInfluenced = 0
         if "smallWorld" in self.trendemic.networkTypes:
             fractionInfluenced += self.smallWorldWeight * smallWorldFractionInfluenced
@@ -48,7 +50,7 @@ class Agent:
 
         # If enough neighbors are influenced, guarantee agent is influenced next timestep
         if fractionInfluenced >= self.threshold:
-            self.setInfluenced()
+            self.nextInfluenced = True
 
     def doTimestep(self, timestep):
         self.timestep = timestep
@@ -58,7 +60,7 @@ class Agent:
 
     def isInGroup(self, group, notInGroup=False):
         membership = False
-        if group == "influencer":
+        if group == "influencers":
             membership = self.influencer
 
         if notInGroup == True:
@@ -66,17 +68,28 @@ class Agent:
         return membership
 
     def setInfluenced(self):
+        # Withdraw the agent's previous state from runtime stats before it changes
+        self.trendemic.removeFromRuntimeStats(self)
         self.influenced = True
         self.timestepInfluenced = self.trendemic.timestep
+        self.trendemic.recordInfluenced(self)
 
     def setInfluencer(self):
+        self.trendemic.removeFromRuntimeStats(self)
         self.influenced = True
         self.influencer = True
         self.timestepInfluenced = self.trendemic.timestep
+        self.trendemic.recordInfluenced(self)
+
+    def updateInfluence(self):
+        # Apply influence only after every agent has seen the same neighborhood state
+        if self.nextInfluenced == True and self.influenced == False:
+            self.setInfluenced()
+        self.nextInfluenced = False
 
     def updateValues(self):
         # Method to be used by child classes to do interesting things with agent behavior
         return
 
     def __str__(self):
-        return f"{self.ID}: Influencer: {self.influencer}, Neighbors: {len(self.neighbors)}"
+        return f"{self.ID}: Influencer: {self.influencer}, Neighbors: {self.trendemic.graph.degree(self.ID)}"
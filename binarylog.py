@@ -0,0 +1,46 @@
+import numpy
+
+import sys
+
+CHUNK_ROWS = 1024
+NPY_MAGIC = b"\x93NUMPY\x01\x00"
+
+class BinaryLog:
+    def __init__(self, path, columns, chunkRows=CHUNK_ROWS):
+        self.columns = columns
+        self.dtype = numpy.dtype([(column, "<f8") for column in columns])
+        # Preallocated row buffer whose fields act as column buffers between flushes
+        self.buffer = numpy.zeros(chunkRows, dtype=self.dtype)
+        self.bufferedRows = 0
+        self.totalRows = 0
+        self.file = open(path, "wb")
+        self.file.write(self.formatHeader(0))
+
+    def close(self):
+        self.flush()
+        self.file.seek(0)
+        self.file.write(self.formatHeader(self.totalRows))
+        self.file.close()
+
+    def flush(self):
+        if self.bufferedRows > 0:
+            self.file.write(self.buffer[:self.bufferedRows].tobytes())
+            self.totalRows += self.bufferedRows
+            self.bufferedRows = 0
+        self.file.flush()
+
+    def formatHeader(self, numRows):
+        # Standard NPY version 1.0 header so logs load directly with numpy.load
+        header = repr({"descr": self.dtype.descr, "fortran_order": False, "shape": (numRows,)}).encode("latin1")
+        # Pad for the largest possible row count so the header can be rewritten in place once the run ends
+        largestHeader = repr({"descr": self.dtype.descr, "fortran_order": False, "shape": (sys.maxsize,)}).encode("latin1")
+        preambleLength = len(NPY_MAGIC) + 2
+        headerLength = ((preambleLength + len(largestHeader) + 1 + 63) // 64) * 64 - preambleLength
+        header = header.ljust(headerLength - 1) + b"\n"
+        return NPY_MAGIC + len(header).to_bytes(2, "little") + header
+
+    def write(self, row):
+        self.buffer[self.bufferedRows] = tuple(row[column] for column in self.columns)
+        self.bufferedRows += 1
+        if self.bufferedRows == len(self.buffer):
+            self.flush()
@@ -1,21 +1,104 @@
+import copy
 import csv
 import getopt
 import json
+import math
 import multiprocessing
 import os
 import random
 import sys
+import threading
 import time
 
+# Append-only record of finished simulation logs shared by every job in a dataset directory
+COMPLETION_MANIFEST = "completed.manifest"
+# Profiling reports of every run in a dataset directory summarized by sweep parameter value
+PROFILE_SUMMARY = "profiles.json"
+
+# Simulations run inside persistent worker processes, so import the simulator from the repository root
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import trendemic
+
+def aggregateProfiles(config, path):
+    if path[-1] != '/':
+        path = path + '/'
+    reports = {}
+    processPeakMemory = []
+    for filename in sorted(os.listdir(path)):
+        if not filename.endswith(".profile"):
+            continue
+        try:
+            reportFile = open(path + filename)
+            report = json.loads(reportFile.read())
+            reportFile.close()
+        except:
+            continue
+        # Reports are named after their run, whose sweep value precedes the seed
+        run = filename[:-len(".profile")].rsplit('-', 1)[0]
+        reports.setdefault(run, []).append(report)
+        # Peak memory spans every run of the worker process, so it is only summarized across the whole dataset
+        if report["processPeakMemoryBytes"] != None:
+            processPeakMemory.append(report["processPeakMemoryBytes"])
+    summaries = {}
+    for run, runReports in reports.items():
+        phases = {}
+        for phase in sorted(set(phase for report in runReports for phase in report["phases"])):
+            phaseReports = [report["phases"][phase] for report in runReports if phase in report["phases"]]
+            phases[phase] = {"calls": findSummaryStatistics([phaseReport["calls"] for phaseReport in phaseReports]),
+                             "totalSeconds": findSummaryStatistics([phaseReport["totalSeconds"] for phaseReport in phaseReports])}
+        counters = {}
+        for counter in sorted(set(counter for report in runReports for counter in report["counters"])):
+            counters[counter] = findSummaryStatistics([report["counters"].get(counter, 0) for report in runReports])
+        summaries[run] = {"counters": counters, "phases": phases, "runs": len(runReports), "wallSeconds": findSummaryStatistics([report["wallSeconds"] for report in runReports])}
+    summaryFile = open(path + PROFILE_SUMMARY, 'w')
+    summary = {"processPeakMemoryBytes": max(processPeakMemory) if len(processPeakMemory) > 0 else None, "sweepParameter": config["dataCollectionOptions"]["sweepParameter"], "sweepValues": summaries}
+    summaryFile.write(json.dumps(summary, indent=4, sort_keys=True) + "\n")
+    summaryFile.close()
+    print(f"Summarized {sum(len(runReports) for runReports in reports.values())} profiling reports in {path}{PROFILE_SUMMARY}.")
+
+def createConfiguration(config, path, mode, run, seed):
+    dataOpts = config["dataCollectionOptions"]
+    parameter = dataOpts["sweepParameter"]
+    simOpts = config["trendemicOptions"]
+    if type(simOpts[parameter]) == list:
+        simOpts[parameter] = [run, run]
+    else:
+        simOpts[parameter] = run
+    simOpts["seed"] = seed
+    if mode == "json":
+        simOpts["logfile"] = f"{path}{run}-{seed}.json"
+        simOpts["logfileFormat"] = "json"
+    elif mode == "npy":
+        simOpts["logfile"] = f"{path}{run}-{seed}.npy"
+        simOpts["logfileFormat"] = "npy"
+    else:
+        simOpts["logfile"] = f"{path}{run}-{seed}.csv"
+        simOpts["logfileFormat"] = "csv"
+    # Share generated networks across every sweep value using the same seed
+    simOpts["graphCache"] = f"{path}graphs"
+    simOpts["completionManifest"] = f"{path}{COMPLETION_MANIFEST}"
+    if simOpts.get("profileMode") == True:
+        simOpts["profileReport"] = f"{path}{run}-{seed}.profile"
+    if simOpts.get("screenshots") == True:
+        simOpts["screenshotPath"] = f"{path}screenshots/{run}-{seed}"
+    # Enforce noninteractive, no-output mode
+    simOpts["headlessMode"] = True
+    simOpts["debugMode"] = ["none"]
+    confFilePath = f"{path}{run}-{seed}.config"
+    conf = open(confFilePath, 'w')
+    conf.write(json.dumps(simOpts))
+    conf.close()
+    # Configuration files are kept to detect incomplete runs, while jobs receive their configuration in memory
+    return (confFilePath, copy.deepcopy(simOpts))
+
 def createConfigurations(config, path, mode="json"):
-    configs = getJobsToDo(config, path)
-    if len(configs) == 0:
+    jobs = getJobsToDo(config, path)
+    if len(jobs) == 0:
         print("Generating new configurations for random seeds.")
         if path[-1] != '/':
             path = path + '/'
         dataOpts = config["dataCollectionOptions"]
         seeds = generateSeeds(dataOpts)
-        confFiles = []
         for seed in seeds:
             sweep = []
             parameter = dataOpts["sweepParameter"]
@@ -47,34 +130,17 @@ def createConfigurations(config, path, mode="json"):
                     curr = round(curr + parameterIncrement, decimals)
 
             for run in sweep:
-                simOpts = config["trendemicOptions"]
-                if type(simOpts[parameter]) == list:
-                    simOpts[parameter] = [run, run]
-                else:
-                    simOpts[parameter] = run
-                simOpts["seed"] = seed
-                if mode == "json":
-                    simOpts["logfile"] = f"{path}{run}-{seed}.json"
-                    simOpts["logfileFormat"] = "json"
-                else:
-                    simOpts["logfile"] = f"{path}{run}-{seed}.csv"
-                    simOpts["logfileFormat"] = "csv"
-                # Enforce noninteractive, no-output mode
-                simOpts["headlessMode"] = True
-                simOpts["debugMode"] = ["none"]
-                confFilePath = f"{path}{run}-{seed}.config"
-                confFiles.append(confFilePath)
-                conf = open(confFilePath, 'w')
-                conf.write(json.dumps(simOpts))
-                conf.close()
-        return confFiles
-    return configs
+                jobs.append(createConfiguration(config, path, mode, run, seed))
+    return jobs
 
 def finishSimulations():
     # Sleep to prevent printing from occurring out of order with final job submission
     time.sleep(1)
     print("Waiting for jobs to finish up.")
 
+def findSummaryStatistics(values):
+    return {"max": max(values), "mean": sum(values) / len(values), "min": min(values)}
+
 def generateSeeds(config):
     seeds = []
     for i in range(config["numSeeds"]):
@@ -88,43 +154,65 @@ def getJobsToDo(config, path):
     print("Searching for incomplete logs from previously created seeds.")
     encodedDir = os.fsencode(path)
     simOpts = config["trendemicOptions"]
+    completedLogs = readCompletionManifest(path)
     configs = []
     for file in os.listdir(encodedDir):
         filename = os.fsdecode(file)
         if not filename.endswith(".config"):
             continue
+        # Runs recorded as finished are skipped without opening their configuration or log
+        stem = filename[:-len(".config")]
+        if stem in completedLogs and os.path.exists(completedLogs[stem]):
+            continue
         filePath = path + filename
         configs.append(filePath)
-    completedRuns = []
+    jobs = []
     for config in configs:
         configFile = open(config)
         rawConf = json.loads(configFile.read())
         log = rawConf["logfile"]
         configFile.close()
+        jobs.append((config, rawConf))
         if os.path.exists(log) == False:
             continue
         try:
-            logFile = open(log)
-            lastEntry = None
-            if log.endswith(".json"):
-                lastEntry = json.loads(logFile.read())[-1]
-            else:
-                lastEntry = list(csv.DictReader(logFile))[-1]
-            logFile.close()
-            if int(lastEntry["timestep"]) == int(rawConf["timesteps"]) or int(lastEntry["population"]) == 0:
-                completedRuns.append(config)
+            lastEntry = readLastLogEntry(log)
+            if int(lastEntry["timestep"]) == int(rawConf["timesteps"]) or int(lastEntry["agents"]) == 0:
+                jobs.pop()
             else:
                 os.remove(log)
         except:
             os.remove(log)
             continue
-    for run in completedRuns:
-        configs.remove(run)
-    if len(configs) == 0:
+    if len(jobs) == 0:
         print("No incomplete logs found.")
     else:
-        print("Found {len(configs)} logs to rerun.")
-    return configs
+        print(f"Found {len(jobs)} logs to rerun.")
+    return jobs
+
+def groupJobs(config, jobs):
+    dataOpts = config["dataCollectionOptions"]
+    batchMode = dataOpts.get("batchMode")
+    if batchMode == "seeds":
+        # Seeds of the same sweep value differ only in their seed and output files, so they advance together in one batched engine
+        batchedOptions = ("logfile", "profileReport", "screenshotPath", "seed")
+    elif batchMode == "sweep":
+        # Sweep values of the same seed usually leave the network unchanged, so the batch builds its graph once and shares it
+        batchedOptions = ("logfile", "profileReport", "screenshotPath", dataOpts["sweepParameter"])
+    else:
+        return [[job] for job in jobs]
+    groups = {}
+    for job in jobs:
+        (configFile, configuration) = job
+        sharedOptions = {key: value for key, value in configuration.items() if key not in batchedOptions}
+        groups.setdefault(json.dumps(sharedOptions, sort_keys=True), []).append(job)
+    # Split large groups so every worker process still receives a batch
+    batchSize = math.ceil(len(jobs) / dataOpts["numParallelSimJobs"])
+    batches = []
+    for group in groups.values():
+        for i in range(0, len(group), batchSize):
+            batches.append(group[i:i + batchSize])
+    return batches
 
 def parseOptions():
     commandLineArgs = sys.argv[1:]
@@ -162,7 +250,7 @@ def parseOptions():
     return options
 
 def printHelp():
-    print("Usage:\n\tpython run.py --conf /path/to/config\n\nOptions:\n\t-c,--conf\tUse the specified path to configurable settings file.\n\t-m,--mode\tUse the specified file format for simulation logs.\n\t-p,--path\tUse the specified directory path to store dataset JSON files.\n\t-h,--help\tDisplay this message.")
+    print("Usage:\n\tpython run.py --conf /path/to/config\n\nOptions:\n\t-c,--conf\tUse the specified path to configurable settings file.\n\t-m,--mode\tUse the specified file format for simulation logs (csv, json, or npy).\n\t-p,--path\tUse the specified directory path to store dataset JSON files.\n\t-h,--help\tDisplay this message.")
     exit(0)
 
 def printProgress(lastJob, jobsFinished, totalJobs, jobLength, decimals=2):
@@ -173,37 +261,162 @@ def printProgress(lastJob, jobsFinished, totalJobs, jobLength, decimals=2):
     printString = f"\rRunning {lastJob:>{jobLength}}: |{bar}| {jobsFinished} / {totalJobs} ({progress}%)"
     print(f"\r{printString}", end='\r')
 
-def runSimulation(configFile, pythonAlias, jobNumber, totalJobs, count, printFileLength):
-    os.system(f"{pythonAlias} ../trendemic.py --conf {configFile} &> /dev/null")
-    count.value += 1
-    printProgress(configFile, count.value, totalJobs, printFileLength)
+def probeSweepValue(config, path, mode, run, seeds):
+    jobs = [createConfiguration(config, path, mode, run, seed) for seed in seeds]
+    finalStats = [stats for stats in runSimulations(config, jobs).values() if stats != None]
+    if len(finalStats) == 0:
+        return None
+    # Pool agents across seeds, matching the aggregate adoption used by the plotting summary table
+    agents = sum(stats["agents"] for stats in finalStats)
+    influenced = sum(stats["influenced"] for stats in finalStats)
+    adoption = influenced / agents if agents > 0 else 0
+    print(f"Sweep value {run}: adoption {round(adoption, 4)} over {len(finalStats)} seeds.")
+    return adoption
+
+def readCompletionManifest(path):
+    completedLogs = {}
+    manifestPath = os.path.join(path, COMPLETION_MANIFEST)
+    if os.path.exists(manifestPath) == False:
+        return completedLogs
+    manifest = open(manifestPath)
+    for line in manifest:
+        try:
+            record = json.loads(line)
+        except:
+            # Skip a record cut short by an interrupted write
+            continue
+        logfile = record["logfile"]
+        completedLogs[os.path.splitext(os.path.basename(logfile))[0]] = logfile
+    manifest.close()
+    return completedLogs
+
+def readLastLogEntry(log):
+    # Logs written before completion records existed are checked by reading only their last row
+    if log.endswith(".npy"):
+        import numpy
+        lastRow = numpy.load(log, mmap_mode="r")[-1]
+        return dict(zip(lastRow.dtype.names, lastRow.tolist()))
+    logFile = open(log, "rb")
+    logFile.seek(0, os.SEEK_END)
+    fileSize = logFile.tell()
+    tailSize = 4096
+    lines = []
+    # Widen the tail until it holds a complete final row
+    while True:
+        logFile.seek(max(fileSize - tailSize, 0))
+        lines = [line.strip() for line in logFile.read().decode().splitlines() if line.strip() != ""]
+        if tailSize >= fileSize or len(lines) > 2:
+            break
+        tailSize *= 2
+    if log.endswith(".json"):
+        logFile.close()
+        rows = [line for line in lines if line.startswith('{')]
+        return json.loads(rows[-1].rstrip(','))
+    logFile.seek(0)
+    header = logFile.readline().decode().strip()
+    logFile.close()
+    return dict(zip(header.split(','), lines[-1].split(',')))
+
+def runSimulation(batch):
+    configFiles = [configFile for configFile, configuration in batch]
+    try:
+        if len(batch) == 1:
+            stats = [trendemic.runConfiguration(batch[0][1])]
+        else:
+            stats = trendemic.runBatch([configuration for configFile, configuration in batch])
+    except:
+        stats = [None] * len(batch)
+    return list(zip(configFiles, stats))
 
-def runSimulations(config, configFiles):
+def runSimulations(config, jobs):
     dataOpts = config["dataCollectionOptions"]
-    pythonAlias = dataOpts["pythonAlias"]
-    totalSimJobs = len(configFiles)
+    totalSimJobs = len(jobs)
+    printFileLength = len(max([configFile for configFile, configuration in jobs], key=len))
 
-    # Submit simulation jobs to local worker pool
-    manager = multiprocessing.Manager()
-    counter = manager.Value('i', 0)
-    printFileLength = len(max(configFiles, key=len))
+    # Keep a bounded number of jobs queued ahead of the workers and let completions release the next submissions
+    window = threading.Semaphore(2 * dataOpts["numParallelSimJobs"])
+    # Workers stay alive across jobs so interpreter startup and imports are paid once per worker
     pool = multiprocessing.Pool(processes = dataOpts["numParallelSimJobs"])
-    results = [pool.apply_async(runSimulation, args=(configFile, pythonAlias, i + 1, totalSimJobs, counter, printFileLength)) for i, configFile in enumerate(configFiles)]
-
-    # Wait for jobs to finish
-    while len(results) > 0:
-        waitingResults = []
-        for result in results:
-            ready = result.ready()
-            if ready == False:
-                waitingResults.append(result)
-        results = waitingResults
+    jobsFinished = 0
+    failedJobs = []
+    finalStats = {}
+    for results in pool.imap_unordered(runSimulation, submitJobs(groupJobs(config, jobs), window)):
+        window.release()
+        for configFile, stats in results:
+            jobsFinished += 1
+            finalStats[configFile] = stats
+            if stats == None:
+                failedJobs.append(configFile)
+        printProgress(configFile, jobsFinished, totalSimJobs, printFileLength)
 
     # Clean up job pool
     pool.close()
     pool.join()
     print(f"\r{' ' * os.get_terminal_size().columns}", end='\r')
+    if len(failedJobs) > 0:
+        print(f"{len(failedJobs)} jobs failed and will be rerun on the next invocation.")
     print("All jobs completed.")
+    return finalStats
+
+def searchTippingPoint(config, path, mode="json"):
+    if path[-1] != '/':
+        path = path + '/'
+    dataOpts = config["dataCollectionOptions"]
+    adoptionThreshold = config["trendemicOptions"]["adoptionThreshold"]
+    precision = dataOpts["searchPrecision"]
+    searchDirection = "lowest"
+    if "thresholdSearchDirection" in dataOpts:
+        searchDirection = dataOpts["thresholdSearchDirection"]
+    precisionDecimals = str(precision).split('.')
+    decimals = len(precisionDecimals[1]) if len(precisionDecimals) > 1 else 0
+    # Every probe reuses the same seeds so differences between sweep values are not masked by seed noise
+    seeds = generateSeeds(dataOpts)
+    print(f"Searching for the tipping point of {dataOpts['sweepParameter']} to a precision of {precision}.")
+
+    (low, high) = dataOpts["sweepRange"]
+    lowAdoption = probeSweepValue(config, path, mode, low, seeds)
+    highAdoption = probeSweepValue(config, path, mode, high, seeds)
+    if lowAdoption == None or highAdoption == None:
+        print("Unable to search for the tipping point since all simulations of a sweep value failed.")
+        return None
+    lowMeets = lowAdoption >= adoptionThreshold
+    highMeets = highAdoption >= adoptionThreshold
+    probes = 2
+    tippingPoint = None
+    if searchDirection == "highest" and highMeets == True:
+        tippingPoint = high
+    elif searchDirection != "highest" and lowMeets == True:
+        tippingPoint = low
+    elif lowMeets != highMeets:
+        # Adoption crosses the threshold between the bounds, so halve the bracket around the crossing until within the precision
+        while high - low > precision:
+            middle = round((low + high) / 2, decimals)
+            if decimals == 0:
+                middle = int(middle)
+            if middle == low or middle == high:
+                break
+            middleAdoption = probeSweepValue(config, path, mode, middle, seeds)
+            probes += 1
+            if middleAdoption == None:
+                print("Unable to search for the tipping point since all simulations of a sweep value failed.")
+                return None
+            if (middleAdoption >= adoptionThreshold) == lowMeets:
+                low = middle
+            else:
+                high = middle
+        tippingPoint = low if lowMeets == True else high
+
+    if tippingPoint != None:
+        print(f"\n=== Tipping Point Search ===\nSweep Parameter = {dataOpts['sweepParameter']}\nTipping Point = {tippingPoint}\nSimulations Run = {probes * len(seeds)}")
+    else:
+        print("No sweep value reached the adoption threshold.")
+    return tippingPoint
+
+def submitJobs(jobs, window):
+    for job in jobs:
+        # Blocks the pool's task feeder rather than the coordinator until a running job completes
+        window.acquire()
+        yield job
 
 def verifyConfiguration(configuration):
     # Check if number of parallel jobs is greater than number of CPU cores
@@ -232,8 +445,15 @@ if __name__ == "__main__":
         exit(1)
 
     config = verifyConfiguration(config)
-    configFiles = createConfigurations(config, path, mode)
-    if seedsOnly == False:
-        runSimulations(config, configFiles)
+    if config["dataCollectionOptions"].get("searchPrecision") != None and seedsOnly == False:
+        searchTippingPoint(config, path, mode)
+        if config["trendemicOptions"].get("profileMode") == True:
+            aggregateProfiles(config, path)
+        exit(0)
+    jobs = createConfigurations(config, path, mode)
+    if seedsOnly == False and len(jobs) > 0:
+        runSimulations(config, jobs)
+    if seedsOnly == False and config["trendemicOptions"].get("profileMode") == True:
+        aggregateProfiles(config, path)
 
     exit(0)
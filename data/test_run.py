@@ -0,0 +1,78 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import run
+import trendemic
+
+class GroupJobsTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createJobs(self, batchMode):
+        config = {"dataCollectionOptions": {"batchMode": batchMode, "numParallelSimJobs": 1, "sweepParameter": "agentThreshold"},
+                  "trendemicOptions": {"agentThreshold": 0.2, "numAgents": 10, "profileMode": True, "timesteps": 5}}
+        jobs = []
+        for seed in (1, 2, 3):
+            for sweepValue in (0.2, 0.3):
+                jobs.append(run.createConfiguration(config, self.path, "csv", sweepValue, seed))
+        return (config, jobs)
+
+    def testProfiledSeedsShareBatches(self):
+        (config, jobs) = self.createJobs("seeds")
+        batches = run.groupJobs(config, jobs)
+        self.assertEqual(len(batches), 2)
+        for batch in batches:
+            self.assertEqual(len(batch), 3)
+            self.assertEqual(len(set(configuration["profileReport"] for configFile, configuration in batch)), 3)
+
+    def testProfiledSweepValuesShareBatches(self):
+        (config, jobs) = self.createJobs("sweep")
+        batches = run.groupJobs(config, jobs)
+        self.assertEqual(len(batches), 3)
+        for batch in batches:
+            self.assertEqual(len(batch), 2)
+
+class TippingPointSearchTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createConfig(self, sweepParameter, sweepRange, searchPrecision, searchDirection, trendemicOptions):
+        # Agents on a ring each have two small world neighbors and give the small world network all their weight
+        config = {"dataCollectionOptions": {"batchMode": None, "numParallelSimJobs": 1, "numSeeds": 2, "searchPrecision": searchPrecision,
+                                            "sweepParameter": sweepParameter, "sweepRange": sweepRange, "thresholdSearchDirection": searchDirection},
+                  "trendemicOptions": {"adoptionThreshold": 0.75, "agentScaleFreeSmallWorldRatio": [0.0, 0.0], "networkTypes": ["smallWorld"],
+                                       "numAgents": 60, "smallWorldEdgesPerAgent": 2, "smallWorldRewiringProbability": 0.0}}
+        config["trendemicOptions"].update(trendemicOptions)
+        return config
+
+    def runSimulations(self, config, jobs):
+        # Run probes in this process, since the worker pool's progress output needs a terminal
+        return {configFile: trendemic.runConfiguration(configuration) for (configFile, configuration) in jobs}
+
+    def searchTippingPoint(self, config):
+        with unittest.mock.patch.object(run, "runSimulations", self.runSimulations):
+            return run.searchTippingPoint(config, self.path, "csv")
+
+    def testHighestAgentThreshold(self):
+        # One influenced neighbor is half of an agent's neighbors, so any threshold up to 0.5 spreads around the whole ring
+        config = self.createConfig("agentThreshold", [0.1, 0.9], 0.01, "highest", {"agentThreshold": [0.3, 0.3], "numInfluencers": 1, "timesteps": 40})
+        self.assertEqual(self.searchTippingPoint(config), 0.5)
+
+    def testLowestNumInfluencers(self):
+        # Thresholds no agent can reach leave adoption at exactly the influencers' share of the population
+        config = self.createConfig("numInfluencers", [1, 60], 1, "lowest", {"agentThreshold": [1.5, 1.5], "numInfluencers": 1, "timesteps": 10})
+        self.assertEqual(self.searchTippingPoint(config), 45)
+
+if __name__ == "__main__":
+    unittest.main()
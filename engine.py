@@ -0,0 +1,163 @@
+import graph
+
+import numpy
+
+class ArrayEngine:
+    def __init__(self, trendemic):
+        self.configure([trendemic])
+
+    def addInfluencedNeighbors(self, newlyInfluenced):
+        # Influence is monotone, so neighbor counts only ever grow by the neighbors of newly influenced agents
+        for adjacency in self.adjacencies.values():
+            starts = adjacency["starts"][newlyInfluenced]
+            lengths = adjacency["ends"][newlyInfluenced] - starts
+            total = int(lengths.sum())
+            if total == 0:
+                continue
+            positions = numpy.repeat(starts - (numpy.cumsum(lengths) - lengths), lengths) + numpy.arange(total)
+            neighbors = adjacency["columns"][positions] + numpy.repeat(self.columnOffsets[newlyInfluenced], lengths)
+            adjacency["influencedNeighbors"] += numpy.bincount(neighbors, minlength=self.numAgents)
+
+    def applyInfluence(self, newlyInfluenced):
+        # Only agents changing state are touched at the object level to keep runtime stats and interface in sync
+        for (simulation, agentID) in self.findSimulationAgents(newlyInfluenced):
+            simulation.agents[agentID].setInfluenced()
+
+    def configure(self, simulations):
+        # Simulations sharing a graph are kept next to each other so their states form one simulation by agent matrix
+        graphGroups = {}
+        for simulation in simulations:
+            graphGroups.setdefault(id(simulation.graph), []).append(simulation)
+        self.simulations = [simulation for group in graphGroups.values() for simulation in group]
+        self.offsets = [0]
+        for simulation in self.simulations:
+            self.offsets.append(self.offsets[-1] + len(simulation.agents))
+        self.numAgents = self.offsets[-1]
+
+        self.influenced = numpy.zeros(self.numAgents, dtype=bool)
+        self.scaleFreeWeights = numpy.zeros(self.numAgents)
+        self.smallWorldWeights = numpy.zeros(self.numAgents)
+        self.thresholds = numpy.zeros(self.numAgents)
+        self.configureState()
+        self.configureAdjacency(graphGroups.values())
+        self.addInfluencedNeighbors(numpy.flatnonzero(self.influenced))
+
+    def configureAdjacency(self, graphGroups):
+        self.blocks = []
+        (degrees, scaleFreeDegrees, smallWorldDegrees, columnOffsets) = ([], [], [], [])
+        self.adjacencies = {"scaleFree": {"columns": [], "ends": [], "starts": []}, "smallWorld": {"columns": [], "ends": [], "starts": []}}
+        start = 0
+        for group in graphGroups:
+            network = group[0].graph
+            network.freeze()
+            # Every simulation of a group reads the neighbor lists of their shared graph, which are stored once per layer
+            targets = numpy.frombuffer(network.targets, dtype=numpy.int64)
+            layers = numpy.frombuffer(network.layers, dtype=numpy.uint8)
+            self.blocks.append({"numSimulations": len(group), "numNodes": network.numNodes, "start": start})
+            for (layerName, layer, layerDegrees) in (("scaleFree", graph.SCALE_FREE, network.scaleFreeDegrees), ("smallWorld", graph.SMALL_WORLD, network.smallWorldDegrees)):
+                adjacency = self.adjacencies[layerName]
+                layerDegrees = numpy.frombuffer(layerDegrees, dtype=numpy.int64)
+                rowStarts = sum(len(columns) for columns in adjacency["columns"]) + numpy.concatenate(([0], numpy.cumsum(layerDegrees)[:-1]))
+                adjacency["columns"].append(targets[(layers & layer) != 0])
+                adjacency["starts"].append(numpy.tile(rowStarts, len(group)))
+                adjacency["ends"].append(numpy.tile(rowStarts + layerDegrees, len(group)))
+            # Graph node IDs become agent indices by adding the offset of the simulation holding them
+            columnOffsets.append(numpy.repeat(start + numpy.arange(len(group)) * network.numNodes, network.numNodes))
+            degrees.append(numpy.tile(numpy.frombuffer(network.degrees, dtype=numpy.int64), len(group)))
+            scaleFreeDegrees.append(numpy.tile(numpy.frombuffer(network.scaleFreeDegrees, dtype=numpy.int64), len(group)))
+            smallWorldDegrees.append(numpy.tile(numpy.frombuffer(network.smallWorldDegrees, dtype=numpy.int64), len(group)))
+            start += len(group) * network.numNodes
+        for adjacency in self.adjacencies.values():
+            for key in ("columns", "ends", "starts"):
+                adjacency[key] = numpy.concatenate(adjacency[key])
+            adjacency["influencedNeighbors"] = numpy.zeros(self.numAgents, dtype=numpy.int64)
+        self.columnOffsets = numpy.concatenate(columnOffsets)
+        self.degrees = numpy.concatenate(degrees)
+        self.scaleFreeDegrees = numpy.concatenate(scaleFreeDegrees)
+        self.smallWorldDegrees = numpy.concatenate(smallWorldDegrees)
+
+    def configureState(self):
+        for (simulation, offset) in zip(self.simulations, self.offsets):
+            # A zero weight drops a network layer the simulation does not use without changing the weighted sum
+            scaleFree = "scaleFree" in simulation.networkTypes
+            smallWorld = "smallWorld" in simulation.networkTypes
+            for agent in simulation.agents:
+                self.influenced[offset + agent.ID] = agent.influenced
+                self.scaleFreeWeights[offset + agent.ID] = agent.scaleFreeWeight if scaleFree == True else 0
+                self.smallWorldWeights[offset + agent.ID] = agent.smallWorldWeight if smallWorld == True else 0
+                self.thresholds[offset + agent.ID] = agent.threshold
+
+    def doTimestep(self, timestep):
+        newlyInfluenced = self.findNewlyInfluenced()
+        self.applyInfluence(newlyInfluenced)
+        return newlyInfluenced
+
+    def endSimulation(self, simulation):
+        # Agents of a finished simulation can no longer cross their threshold, keeping them out of every later timestep's work
+        offset = self.offsets[self.simulations.index(simulation)]
+        self.thresholds[offset:offset + len(simulation.agents)] = numpy.inf
+
+    def findFractionsInfluenced(self):
+        # Sum in the same order as Agent.doInfluence for identical floating point results
+        fractionsInfluenced = self.smallWorldWeights * self.findLayerFraction("smallWorld", self.smallWorldDegrees)
+        fractionsInfluenced += self.scaleFreeWeights * self.findLayerFraction("scaleFree", self.scaleFreeDegrees)
+        return fractionsInfluenced
+
+    def findLayerFraction(self, layerName, degrees):
+        layerFraction = numpy.zeros(self.numAgents)
+        numpy.divide(self.adjacencies[layerName]["influencedNeighbors"], degrees, out=layerFraction, where=degrees > 0)
+        return layerFraction
+
+    def findNewlyInfluenced(self):
+        fractionsInfluenced = self.findFractionsInfluenced()
+        newlyInfluenced = numpy.flatnonzero((self.influenced == False) & (self.degrees > 0) & (fractionsInfluenced >= self.thresholds))
+        self.influenced[newlyInfluenced] = True
+        self.addInfluencedNeighbors(newlyInfluenced)
+        return newlyInfluenced
+
+    def findSimulationAgents(self, indices):
+        simulationIndices = numpy.searchsorted(self.offsets, indices, side="right") - 1
+        for (simulationIndex, index) in zip(simulationIndices.tolist(), indices.tolist()):
+            yield (self.simulations[simulationIndex], index - self.offsets[simulationIndex])
+
+    def __str__(self):
+        return f"Array Engine: {len(self.simulations)} simulations over {len(self.blocks)} graphs, {self.numAgents} agents, {int(self.influenced.sum())} influenced"
+
+class BatchEngine(ArrayEngine):
+    def __init__(self, simulations):
+        self.configure(simulations)
+        self.timestep = 0
+        # Agents newly influenced by the latest batched timestep and not yet applied to their simulation
+        self.pendingInfluence = {}
+        self.members = [BatchMember(self, simulation) for simulation in simulations]
+
+    def doSimulationTimestep(self, simulation, timestep):
+        # The first simulation to reach a timestep advances every replica at once
+        if timestep != self.timestep:
+            self.timestep = timestep
+            for (influencedSimulation, agentID) in self.findSimulationAgents(self.findNewlyInfluenced()):
+                self.pendingInfluence.setdefault(influencedSimulation, []).append(agentID)
+        for agentID in self.pendingInfluence.pop(simulation, []):
+            simulation.agents[agentID].setInfluenced()
+
+    def endSimulation(self, simulation):
+        ArrayEngine.endSimulation(self, simulation)
+        self.pendingInfluence.pop(simulation, None)
+
+    def __str__(self):
+        return f"Batch Engine: {len(self.simulations)} simulations over {len(self.blocks)} graphs, {self.numAgents} agents, {int(self.influenced.sum())} influenced"
+
+class BatchMember:
+    def __init__(self, batch, simulation):
+        self.batch = batch
+        self.simulation = simulation
+        simulation.engine = self
+
+    def doTimestep(self, timestep):
+        self.batch.doSimulationTimestep(self.simulation, timestep)
+
+    def endSimulation(self, simulation):
+        self.batch.endSimulation(simulation)
+
+    def __str__(self):
+        return f"Batch Member: {self.batch}"
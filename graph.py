@@ -0,0 +1,276 @@
+import util
+
+import array
+import bisect
+
+SCALE_FREE = 1
+SMALL_WORLD = 2
+BOTH = SCALE_FREE | SMALL_WORLD
+LAYERS = {"scaleFree": SCALE_FREE, "smallWorld": SMALL_WORLD}
+# Identifies the binary graph file format and its version
+FILE_SIGNATURE = b"TRENDEMICGRAPH1\n"
+# Changes whenever a network generator does, so networks cached by an older generator are never reused
+GENERATOR_VERSION = 3
+
+class Graph:
+    def __init__(self, numNodes):
+        self.numNodes = numNodes
+        # Layer bitmask for each undirected edge keyed by its node pair while the graph is being built
+        self.edgeLayers = {}
+        self.frozen = False
+        self.degrees = array.array('q', [0]) * numNodes
+        self.scaleFreeDegrees = array.array('q', [0]) * numNodes
+        self.smallWorldDegrees = array.array('q', [0]) * numNodes
+        # Compressed sparse row adjacency with a layer bitmask per stored edge
+        self.offsets = array.array('q', [0]) * (numNodes + 1)
+        self.targets = array.array('q')
+        self.layers = array.array('B')
+
+    def addEdge(self, source, sink, layer):
+        if source == sink:
+            return False
+        if self.frozen == True:
+            self.thaw()
+        key = self.findEdgeKey(source, sink)
+        currentLayer = self.edgeLayers.get(key, 0)
+        newLayer = currentLayer | layer
+        if newLayer == currentLayer:
+            return False
+        self.edgeLayers[key] = newLayer
+        if currentLayer == 0:
+            self.degrees[source] += 1
+            self.degrees[sink] += 1
+        if layer & SCALE_FREE and not currentLayer & SCALE_FREE:
+            self.scaleFreeDegrees[source] += 1
+            self.scaleFreeDegrees[sink] += 1
+        if layer & SMALL_WORLD and not currentLayer & SMALL_WORLD:
+            self.smallWorldDegrees[source] += 1
+            self.smallWorldDegrees[sink] += 1
+        return True
+
+    def addEdges(self, sources, sinks, layer):
+        # Merge many edges at once through the compressed sparse row arrays rather than one dictionary entry at a time
+        import numpy
+        self.freeze()
+        sources = numpy.asarray(sources, dtype=numpy.int64)
+        sinks = numpy.asarray(sinks, dtype=numpy.int64)
+        distinct = sources != sinks
+        (sources, sinks) = (sources[distinct], sinks[distinct])
+        # Every edge is stored in the rows of both of its endpoints
+        rowSources = numpy.concatenate((numpy.repeat(numpy.arange(self.numNodes), numpy.frombuffer(self.degrees, dtype=numpy.int64)), sources, sinks))
+        rowTargets = numpy.concatenate((numpy.frombuffer(self.targets, dtype=numpy.int64), sinks, sources))
+        rowLayers = numpy.concatenate((numpy.frombuffer(self.layers, dtype=numpy.uint8), numpy.full(2 * len(sources), layer, dtype=numpy.uint8)))
+        keys = rowSources * self.numNodes + rowTargets
+        order = numpy.argsort(keys, kind="stable")
+        (keys, rowLayers) = (keys[order], rowLayers[order])
+        # Entries for the same node pair are merged into one with the union of their layers
+        firsts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+        rowLayers = numpy.bitwise_or.reduceat(rowLayers, firsts) if len(firsts) > 0 else rowLayers
+        (rowSources, rowTargets) = numpy.divmod(keys[firsts], self.numNodes)
+        degrees = numpy.bincount(rowSources, minlength=self.numNodes)
+        self.offsets = findArray('q', numpy.concatenate(([0], numpy.cumsum(degrees))))
+        self.targets = findArray('q', rowTargets)
+        self.layers = findArray('B', rowLayers)
+        self.degrees = findArray('q', degrees)
+        self.scaleFreeDegrees = findArray('q', numpy.bincount(rowSources, weights=(rowLayers & SCALE_FREE) != 0, minlength=self.numNodes))
+        self.smallWorldDegrees = findArray('q', numpy.bincount(rowSources, weights=(rowLayers & SMALL_WORLD) != 0, minlength=self.numNodes))
+
+    def addScaleFreeEdges(self, hubs, edgesPerNode, generator):
+        # Barabasi-Albert preferential attachment grown from a fully connected core of hubs
+        hubs = min(max(hubs, 1), self.numNodes)
+        for source in range(hubs):
+            for sink in range(source + 1, hubs):
+                self.addEdge(source, sink, SCALE_FREE)
+        # Every node appears once per incident edge, so a uniform draw from this list is proportional to degree
+        endpoints = array.array('q')
+        for node in range(hubs):
+            endpoints.extend([node] * self.scaleFreeDegrees[node])
+        for source in range(hubs, self.numNodes):
+            numEdges = min(edgesPerNode, source)
+            sinks = []
+            while len(sinks) < numEdges:
+                if len(endpoints) == 0:
+                    sink = generator.randrange(source)
+                else:
+                    sink = endpoints[generator.randrange(len(endpoints))]
+                if sink not in sinks:
+                    sinks.append(sink)
+            for sink in sinks:
+                self.addEdge(source, sink, SCALE_FREE)
+                endpoints.append(source)
+                endpoints.append(sink)
+        # Hubs neighbor every agent once the network has grown, as they always have
+        for hub in range(hubs):
+            for node in range(hubs, self.numNodes):
+                self.addEdge(hub, node, SCALE_FREE)
+
+    def addSmallWorldEdges(self, edgesPerNode, rewiringProbability, generator):
+        # Watts-Strogatz ring lattice built in full before each lattice edge is rewired to a uniformly random sink with the given probability
+        import numpy
+        if self.numNodes < 2:
+            return
+        maxAttempts = 10
+        offsets = numpy.arange(1, edgesPerNode // 2 + 1)
+        sources = numpy.tile(numpy.arange(self.numNodes), len(offsets))
+        sinks = (sources + numpy.repeat(offsets, self.numNodes)) % self.numNodes
+        # Small populations wrap the ring onto itself, so lattice edges are made unique before rewiring
+        lattice = (sources != sinks)
+        (sources, sinks) = (sources[lattice], sinks[lattice])
+        keys = findEdgeKeys(sources, sinks, self.numNodes)
+        order = numpy.argsort(keys, kind="stable")
+        keys = keys[order]
+        firsts = numpy.concatenate(([True], keys[1:] != keys[:-1]))
+        keys = keys[firsts]
+        sources = sources[order][firsts]
+        sinks = sinks[order][firsts]
+        randomGenerator = numpy.random.default_rng(generator.getrandbits(64))
+        pending = numpy.flatnonzero(randomGenerator.random(len(sources)) < rewiringProbability)
+        # Rewired edges never land on a lattice edge or an earlier rewired edge, so no edge is lost to a duplicate
+        rewiredKeys = numpy.empty(0, dtype=numpy.int64)
+        for attempt in range(maxAttempts):
+            if len(pending) == 0:
+                break
+            candidates = randomGenerator.integers(self.numNodes, size=len(pending))
+            candidateKeys = findEdgeKeys(sources[pending], candidates, self.numNodes)
+            free = (candidates != sources[pending]) & (findSortedMembers(keys, candidateKeys) == False) & (findSortedMembers(rewiredKeys, candidateKeys) == False)
+            valid = numpy.flatnonzero(free)
+            # Only the first of several edges drawing the same new node pair is rewired this attempt
+            order = numpy.argsort(candidateKeys[valid], kind="stable")
+            sortedKeys = candidateKeys[valid][order]
+            firsts = numpy.concatenate(([True], sortedKeys[1:] != sortedKeys[:-1])) if len(sortedKeys) > 0 else numpy.empty(0, dtype=bool)
+            accepted = valid[order][firsts]
+            sinks[pending[accepted]] = candidates[accepted]
+            rewiredKeys = numpy.sort(numpy.concatenate((rewiredKeys, sortedKeys[firsts])))
+            pending = numpy.delete(pending, accepted)
+        # Edges without a free sink after every attempt keep their lattice sink
+        self.addEdges(sources, sinks, SMALL_WORLD)
+
+    def degree(self, node, layer=None):
+        if layer == SCALE_FREE:
+            return self.scaleFreeDegrees[node]
+        elif layer == SMALL_WORLD:
+            return self.smallWorldDegrees[node]
+        return self.degrees[node]
+
+    def edges(self, node):
+        if self.frozen == False:
+            self.freeze()
+        start = self.offsets[node]
+        end = self.offsets[node + 1]
+        return zip(self.targets[start:end], self.layers[start:end])
+
+    def findEdgeKey(self, source, sink):
+        if source > sink:
+            return sink * self.numNodes + source
+        return source * self.numNodes + sink
+
+    def freeze(self):
+        if self.frozen == True:
+            return
+        offsets = array.array('q', [0]) * (self.numNodes + 1)
+        for node in range(self.numNodes):
+            offsets[node + 1] = offsets[node] + self.degrees[node]
+        numEntries = offsets[self.numNodes]
+        targets = array.array('q', [0]) * numEntries
+        layers = array.array('B', [0]) * numEntries
+        # Visiting pairs in sorted order leaves every row sorted by target for binary search lookups
+        position = offsets[:-1]
+        for key in sorted(self.edgeLayers):
+            (source, sink) = divmod(key, self.numNodes)
+            layer = self.edgeLayers[key]
+            targets[position[source]] = sink
+            layers[position[source]] = layer
+            position[source] += 1
+            targets[position[sink]] = source
+            layers[position[sink]] = layer
+            position[sink] += 1
+        self.offsets = offsets
+        self.targets = targets
+        self.layers = layers
+        self.edgeLayers = {}
+        self.frozen = True
+
+    def hasEdge(self, source, sink, layer=BOTH):
+        return self.layer(source, sink) & layer != 0
+
+    def layer(self, source, sink):
+        if self.frozen == False:
+            return self.edgeLayers.get(self.findEdgeKey(source, sink), 0)
+        start = self.offsets[source]
+        end = self.offsets[source + 1]
+        index = bisect.bisect_left(self.targets, sink, start, end)
+        if index < end and self.targets[index] == sink:
+            return self.layers[index]
+        return 0
+
+    def neighbors(self, node, layer=None):
+        if layer == None:
+            if self.frozen == False:
+                self.freeze()
+            return self.targets[self.offsets[node]:self.offsets[node + 1]].tolist()
+        return [neighbor for (neighbor, neighborLayer) in self.edges(node) if neighborLayer & layer]
+
+    def numEdges(self, layer=None):
+        if layer == SCALE_FREE:
+            return sum(self.scaleFreeDegrees) // 2
+        elif layer == SMALL_WORLD:
+            return sum(self.smallWorldDegrees) // 2
+        return sum(self.degrees) // 2
+
+    def save(self, path):
+        self.freeze()
+        header = array.array('q', [self.numNodes, len(self.targets)])
+        contents = FILE_SIGNATURE + b"".join(data.tobytes() for data in (header, self.offsets, self.targets, self.layers, self.degrees, self.scaleFreeDegrees, self.smallWorldDegrees))
+        util.writeFileAtomically(path, contents)
+
+    def thaw(self):
+        for source in range(self.numNodes):
+            for (sink, layer) in self.edges(source):
+                if source < sink:
+                    self.edgeLayers[self.findEdgeKey(source, sink)] = layer
+        self.offsets = array.array('q', [0]) * (self.numNodes + 1)
+        self.targets = array.array('q')
+        self.layers = array.array('B')
+        self.frozen = False
+
+    def __str__(self):
+        return f"Graph: {self.numNodes} nodes, {self.numEdges()} edges ({self.numEdges(SCALE_FREE)} scale free, {self.numEdges(SMALL_WORLD)} small world)"
+
+def findArray(typecode, values):
+    import numpy
+    data = array.array(typecode)
+    data.frombytes(numpy.ascontiguousarray(values, dtype=numpy.int64 if typecode == 'q' else numpy.uint8).tobytes())
+    return data
+
+def findEdgeKeys(sources, sinks, numNodes):
+    import numpy
+    return numpy.minimum(sources, sinks) * numNodes + numpy.maximum(sources, sinks)
+
+def findSortedMembers(sortedValues, values):
+    import numpy
+    if len(sortedValues) == 0:
+        return numpy.zeros(len(values), dtype=bool)
+    indices = numpy.minimum(numpy.searchsorted(sortedValues, values), len(sortedValues) - 1)
+    return sortedValues[indices] == values
+
+def loadGraph(path):
+    graphFile = open(path, "rb")
+    if graphFile.read(len(FILE_SIGNATURE)) != FILE_SIGNATURE:
+        graphFile.close()
+        return None
+    (numNodes, numEntries) = readArray(graphFile, 'q', 2)
+    loaded = Graph(numNodes)
+    loaded.offsets = readArray(graphFile, 'q', numNodes + 1)
+    loaded.targets = readArray(graphFile, 'q', numEntries)
+    loaded.layers = readArray(graphFile, 'B', numEntries)
+    loaded.degrees = readArray(graphFile, 'q', numNodes)
+    loaded.scaleFreeDegrees = readArray(graphFile, 'q', numNodes)
+    loaded.smallWorldDegrees = readArray(graphFile, 'q', numNodes)
+    loaded.frozen = True
+    graphFile.close()
+    return loaded
+
+def readArray(graphFile, typecode, length):
+    data = array.array(typecode)
+    data.fromfile(graphFile, length)
+    return data
@@ -1,19 +1,19 @@
+import graph
+import layout
+import render
+
 import math
+import os
+import queue
 import random
+import threading
 import tkinter
 
-ATTRACTIVE_FORCE = 0.00005
-FORCE_DIRECTED_DAMPING = 0.88
-FORCE_DIRECTED_LAYOUT_ROUNDS = 75
-LOADING_SCREEN_DELAY = 100
-REPULSIVE_FORCE = 250
-INITIAL_RADIUS = 50
-MIN_EDGE_WIDTH = 0.3
-MAX_EDGE_WIDTH = 2.0
-MIN_NODE_SIZE = 8
-MAX_NODE_SIZE = 40
-MIN_AGENTS_EXPECTED = 10
-MAX_AGENTS_EXPECTED = 100
+LAYOUT_ROUNDS_PER_UPDATE = 5
+LAYOUT_UPDATE_INTERVAL = 50
+INITIAL_DRAWING_DELAY = 100
+# Canvas tags for the edges of each combination of network layers
+EDGE_TAGS = {graph.SCALE_FREE: "scaleFreeEdge", graph.SMALL_WORLD: "smallWorldEdge", graph.BOTH: "bothEdge"}
 
 class GUI:
     def __init__(self, trendemic, screenHeight=1000, screenWidth=900):
@@ -25,46 +25,31 @@ class GUI:
         self.shuffledAgents = self.trendemic.agents[:]
         random.shuffle(self.shuffledAgents)
         self.edges = []
+        self.graphDrawn = False
+        # Layout positions normalized to the drawable area of the canvas, computed once and rescaled on resize
+        self.layoutPositions = None
+        # Refined layout positions handed from the layout thread to the interface thread
+        self.layoutUpdates = queue.Queue()
+        self.layoutThread = None
         self.window = None
         self.doubleClick = False
         self.resizeID = None
 
-        self.palette = ["#FA3232", "#3232FA", "#32FA32", "#32FAFA", "#FA32FA", "#AA3232", "#3232AA", "#32AA32", "#32AAAA", "#AA32AA", "#FA8800", "#00FA88", "#8800FA", "#FA8888", "#8888FA", "#88FA88", "#FA3288", "#3288FA", "#88FA32", "#AA66AA", "#66AAAA", "#3ED06E", "#6E3ED0", "#D06E3E", "#000000"]
-        self.colors = {"default": self.palette[0], "influencer": self.palette[1], "influenced": self.palette[2]}
+        self.palette = render.PALETTE
+        self.colors = dict(render.FILL_COLORS)
 
         # Set the default strings for interface at simulation start
         self.defaultSimulationString = "Timestep: - | Agents: - | Influenced: - | Adoption Fraction: - | Mean Degree for Newly Influenced: -"
 
         self.widgets = {}
         self.borderEdge = 5
-        self.graphBorder = 90
+        self.graphBorder = layout.GRAPH_BORDER
         self.menuTrayColumns = 3
         self.siteHeight = 0
         self.siteWidth = 0
         self.stopSimulation = False
         self.configureWindow()
     
-    def clampNodeToScreen(self, node):
-        self.canvas.update_idletasks()
-        canvasWidth = self.canvas.winfo_width()
-        canvasHeight = self.canvas.winfo_height()
-
-        minX = self.graphBorder
-        minY = self.graphBorder
-        size = node.get("size", self.siteWidth)
-        maxX = canvasWidth - size - self.graphBorder
-        maxY = canvasHeight - size - self.graphBorder
-
-        if node['x'] < minX:
-            node['x'] = minX
-        elif node['x'] > maxX:
-            node['x'] = maxX
-
-        if node['y'] < minY:
-            node['y'] = minY
-        elif node['y'] > maxY:
-            node['y'] = maxY
-
     def configureButtons(self, window):
         playButton = tkinter.Button(window, text="Play Simulation", command=self.doPlayButton)
         playButton.grid(row=0, column=0, sticky="nsew")
@@ -105,31 +90,36 @@ class GUI:
     def configureEditingModes(self):
         return ["Add Agent"]
 
+    def configureEdges(self):
+        self.edges = []
+        edgeWidth = layout.findEdgeWidth(len(self.trendemic.agents))
+        for agent in self.shuffledAgents:
+            agentID = agent.ID
+            aX, aY = self.findMidpoint(self.nodes[agentID])
+            for neighborID, layer in self.trendemic.graph.edges(agentID):
+                # Each undirected edge is stored for both endpoints, so only draw it from the lower ID
+                if neighborID < agentID:
+                    continue
+                bX, bY = self.findMidpoint(self.nodes[neighborID])
+                edge = self.canvas.create_line(aX, aY, bX, bY, width=edgeWidth, tags=("edge", EDGE_TAGS[layer]))
+                self.edges.append((edge, agentID, neighborID))
+        self.drawEdges()
+
     def configureGraph(self):
         self.canvas.delete("all")
+        self.graphDrawn = False
         self.nodes = [None for i in range(len(self.trendemic.agents))]
         self.edges = [] 
-        self.showLoadingScreen()
-        i = 1
-        # Calculate degree for dynamic scaling
-        degrees = [len(agent.neighbors) for agent in self.trendemic.agents]
-        minDeg = min(degrees)
-        maxDeg = max(degrees)
-
+        sizes = layout.findNodeSizes(self.trendemic.graph)
         # Setup initial radial dispersion of nodes for force-directed layout
-        n = len(self.trendemic.agents)
-        for agent in self.shuffledAgents: 
-            angle = (2 * math.pi * i) / n
-            stepX = math.cos(angle)
-            stepY = math.sin(angle)
-            fillColor = self.lookupFillColor(agent)
-            nodeSize = self.getNodeSize(agent, minDeg, maxDeg)
-            radius = INITIAL_RADIUS
-            x = stepX * radius + (self.screenWidth / 2)
-            y = stepY * radius + (self.screenHeight / 2)
-            self.nodes[agent.ID] = { "agent": agent, 'x': x, 'y': y, "deltaX": 0, "deltaY": 0,"color": fillColor, "size": nodeSize}
-            i += 1
-        self.doForceDirection()
+        (initialX, initialY) = layout.findInitialPositions([agent.ID for agent in self.shuffledAgents], self.screenWidth / 2, self.screenHeight / 2)
+        for agent in self.trendemic.agents:
+            self.nodes[agent.ID] = {"agent": agent, 'x': initialX[agent.ID], 'y': initialY[agent.ID], "color": self.lookupFillColor(agent), "size": sizes[agent.ID]}
+        if self.layoutPositions == None:
+            self.layoutPositions = layout.loadLayout(self.trendemic.findLayoutCachePath(), len(self.nodes))
+        if self.layoutPositions == None:
+            self.doForceDirection()
+        self.placeNodes()
 
         for node in self.nodes:
             x = node['x']
@@ -140,8 +130,8 @@ class GUI:
             x2 = x + size
             y2 = y + size
             node["object"] = self.canvas.create_oval(x1, y1, x2, y2, fill=node["color"], outline="#c0c0c0", activestipple="gray50")
-        self.hideLoadingScreen()
-        self.drawEdges()
+        self.configureEdges()
+        self.graphDrawn = True
 
     def configureGraphNames(self):
         return ["TODO"]
@@ -180,43 +170,6 @@ class GUI:
 
         self.doCrossPlatformWindowSizing()
 
-    def destroyCanvas(self):
-        self.canvas.destroy()
-
-    def doAttraction(self):
-        traversed = []
-        attractiveForce = ATTRACTIVE_FORCE
-        for source in self.nodes:
-            for sink in self.nodes:
-                if source in traversed:
-                    continue
-                neighbors = source["agent"].neighbors
-                sinkAgent = None
-                for neighbor in neighbors:
-                    if neighbor == sink["agent"]:
-                        sinkAgent = sink["agent"]
-                        break
-                if sinkAgent == None:
-                    continue
-                (aX, aY) = self.findMidpoint(source)
-                (bX, bY) = self.findMidpoint(sink)
-                dX = bX - aX
-                dY = bY - aY
-                attraction = attractiveForce * (math.sqrt((dX**2) + (dY**2)))
-                theta = math.atan2((bY - aY), (bX - aX))
-                attractionA = ((attraction * math.cos(theta)), (attraction * math.sin(theta)))
-                attractionB = (((-1 * attraction) * math.cos(theta)), ((-1 * attraction) * math.sin(theta)))
-                source["deltaX"] += attractionA[0]
-                source["deltaY"] += attractionA[1]
-                sink["deltaX"] += attractionB[0]
-                sink["deltaY"] += attractionB[1]
-            traversed.append(source)
-        for node in self.nodes:
-            maxStep = 5
-            node['x'] += max(min(node["deltaX"] * FORCE_DIRECTED_DAMPING, maxStep), -1 * maxStep)
-            node['y'] += max(min(node["deltaY"] * FORCE_DIRECTED_DAMPING, maxStep), -1 * maxStep)
-            self.clampNodeToScreen(node)
-
     def doCrossPlatformWindowSizing(self):
         self.window.update_idletasks()
         self.resizeInterface()
@@ -246,54 +199,30 @@ class GUI:
         self.doTimestep()
 
     def doForceDirectedLayout(self):
-        self.window.after(LOADING_SCREEN_DELAY, self.configureGraph)
+        self.window.after(INITIAL_DRAWING_DELAY, self.configureGraph)
 
-    def doForceDirection(self, steps=FORCE_DIRECTED_LAYOUT_ROUNDS):
-        for i in range(steps):
-            self.doRepulsion()
-            self.doAttraction()
+    def doForceDirection(self, steps=layout.FORCE_DIRECTED_LAYOUT_ROUNDS):
+        self.canvas.update_idletasks()
+        # Keep every node inside the graph border of the canvas
+        forceDirectedLayout = layout.ForceDirectedLayout(self.trendemic.graph, [node['x'] for node in self.nodes], [node['y'] for node in self.nodes], [node["size"] for node in self.nodes],
+                                                         self.graphBorder, self.graphBorder, self.canvas.winfo_width() - self.graphBorder, self.canvas.winfo_height() - self.graphBorder)
+        # Draw the initial placement right away and refine it off the interface thread
+        self.layoutPositions = forceDirectedLayout.findNormalizedPositions()
+        self.layoutThread = threading.Thread(target=self.doLayoutRounds, args=(forceDirectedLayout, steps), daemon=True)
+        self.layoutThread.start()
+        self.window.after(LAYOUT_UPDATE_INTERVAL, self.updateLayout)
+
+    def doLayoutRounds(self, forceDirectedLayout, steps):
+        # Runs on the layout thread, so positions are only handed over and never drawn here
+        for i in range(0, steps, LAYOUT_ROUNDS_PER_UPDATE):
+            forceDirectedLayout.doForceDirection(min(LAYOUT_ROUNDS_PER_UPDATE, steps - i))
+            self.layoutUpdates.put(forceDirectedLayout.findNormalizedPositions())
 
     def doPlayButton(self, *args):
         self.trendemic.toggleRun()
         self.widgets["playButton"].config(text="Play Simulation" if self.trendemic.run == False else "Pause Simulation")
         self.doTimestep()
 
-    def doRepulsion(self):
-        traversed = []
-        repulsiveForce = REPULSIVE_FORCE / len(self.trendemic.agents)
-
-        # Set initial values for node's delta values
-        for node in self.nodes:
-            node["deltaX"] = 0
-            node["deltaY"] = 0
-
-        for source in self.nodes:
-            for sink in self.nodes:
-                if source in traversed:
-                    continue
-                (aX, aY) = self.findMidpoint(source)
-                (bX, bY) = self.findMidpoint(sink)
-                dX = bX - aX
-                dY = bY - aY
-                repulsionDenominator = math.sqrt(dX**2 + dY**2)
-                # Prevent incredibly small denominators
-                if repulsionDenominator < 0.01:
-                    repulsionDenominator = 0.01
-                repulsion = repulsiveForce / repulsionDenominator
-                theta = math.atan2(dY, dX)
-                repulsionA = (((-1 * repulsion) * math.cos(theta)), ((-1 * repulsion) * math.sin(theta)))
-                repulsionB = ((repulsion * math.cos(theta)), (repulsion * math.sin(theta)))
-                source["deltaX"] += repulsionA[0]
-                source["deltaY"] += repulsionA[1]
-                sink["deltaX"] += repulsionB[0]
-                sink["deltaY"] += repulsionB[1]
-            traversed.append(source)
-        for node in self.nodes:
-            maxStep = 5
-            node['x'] += max(min(node["deltaX"] * FORCE_DIRECTED_DAMPING, maxStep), -1 * maxStep)
-            node['y'] += max(min(node["deltaY"] * FORCE_DIRECTED_DAMPING, maxStep), -1 * maxStep)
-            self.clampNodeToScreen(node)
-
     def doResize(self, event):
         # Do not resize if capturing a user input event but the event does not come from the GUI window
         if event != None and (event.widget != self.window or (self.screenHeight == event.height and self.screenWidth == event.width)):
@@ -311,15 +240,13 @@ class GUI:
         else:
             self.trendemic.doTimestep()
 
-    def doTimestep(self):
+    def doTimestep(self, changedAgents=None):
         if self.stopSimulation == True:
             self.trendemic.toggleEnd()
             return
-        for agent in self.nodes:
-            fillColor = self.lookupFillColor(agent["agent"])
-            if agent["color"] != fillColor:
-                self.canvas.itemconfig(agent["object"], fill=fillColor)
-            agent["color"] = fillColor
+        # Only agents whose state changed since the last frame need to be recolored
+        if changedAgents != None:
+            self.updateNodeColors(changedAgents)
         self.updateLabels()
         self.window.update()
 
@@ -329,47 +256,21 @@ class GUI:
         self.trendemic.toggleEnd()
 
     def drawEdges(self, *args, **kwargs):
-        for edge in self.edges:
-            self.canvas.delete(edge)
-        self.edges = []
-        num_agents = len(self.trendemic.agents)
-        edgeWidth = self.scale(num_agents, MIN_AGENTS_EXPECTED, MAX_AGENTS_EXPECTED, MAX_EDGE_WIDTH, MIN_EDGE_WIDTH)
-
         mode = self.networkDisplayMode.get()
-        drawnPairs = set()
-
-        for agent in self.shuffledAgents:
-            agentID = agent.ID
-            aX, aY = self.findMidpoint(self.nodes[agentID])
-
-            neighborsToDraw = []
-            if mode == "Scale Free Only":
-                neighborsToDraw = [(n, "red") for n in agent.scaleFreeNeighbors]
-            elif mode == "Small World Only":
-                neighborsToDraw = [(n, "blue") for n in agent.smallWorldNeighbors]
-            elif mode == "Both (Color Coded)":
-                combined = {}
-                for neighbor in agent.scaleFreeNeighbors:
-                    combined[neighbor.ID] = "red"
-                for neighbor in agent.smallWorldNeighbors:
-                    if neighbor.ID in combined:
-                        combined[neighbor.ID] = "purple"  
-                    else:
-                        combined[neighbor.ID] = "blue"
-                neighborsToDraw = [(self.trendemic.agents[nID], color) for nID, color in combined.items()]
+        layerColors = {graph.SCALE_FREE: "red", graph.SMALL_WORLD: "blue", graph.BOTH: "purple"}
+        if mode == "Scale Free Only":
+            layerColors = {graph.SCALE_FREE: "red", graph.BOTH: "red"}
+        elif mode == "Small World Only":
+            layerColors = {graph.SMALL_WORLD: "blue", graph.BOTH: "blue"}
+        elif mode != "Both (Color Coded)":
+            layerColors = {graph.SCALE_FREE: "black", graph.SMALL_WORLD: "black", graph.BOTH: "black"}
+
+        # Edges are only drawn once, so changing display mode restyles or hides each layer's edges through its tag
+        for (layer, tag) in EDGE_TAGS.items():
+            if layer in layerColors:
+                self.canvas.itemconfigure(tag, state=tkinter.NORMAL, fill=layerColors[layer])
             else:
-                neighborsToDraw = [(n, "black") for n in agent.neighbors]
-
-            for neighbor, color in neighborsToDraw:
-                neighborID = neighbor.ID
-                edgeKey = tuple(sorted((agentID, neighborID)))
-                if edgeKey in drawnPairs:
-                    continue
-                drawnPairs.add(edgeKey)
-
-                bX, bY = self.findMidpoint(self.nodes[neighborID])
-                edge = self.canvas.create_line(aX, aY, bX, bY, fill=color, width=edgeWidth)
-                self.edges.append(edge)
+                self.canvas.itemconfigure(tag, state=tkinter.HIDDEN)
 
     def findMidpoint(self, node):
         x = node['x']
@@ -379,47 +280,36 @@ class GUI:
         midpointY = y + (size / 2)
         return (midpointX, midpointY)
         
-    def getNodeSize(self, agent, minDeg, maxDeg):
-        degree = len(agent.neighbors)
-        return self.scale(degree, minDeg, maxDeg, MIN_NODE_SIZE, MAX_NODE_SIZE)
+    def lookupFillColor(self, agent):
+        return render.findFillColor(agent, self.colors)
 
-    def hideLoadingScreen(self):
-        self.loadingLabel.destroy()
-        self.canvas.grid()  
-        self.window.update_idletasks()
+    def moveGraph(self):
+        self.placeNodes()
+        for node in self.nodes:
+            self.canvas.coords(node["object"], node['x'], node['y'], node['x'] + node["size"], node['y'] + node["size"])
+        for (edge, agentID, neighborID) in self.edges:
+            (aX, aY) = self.findMidpoint(self.nodes[agentID])
+            (bX, bY) = self.findMidpoint(self.nodes[neighborID])
+            self.canvas.coords(edge, aX, aY, bX, bY)
 
-    def lookupFillColor(self, agent):
-        if agent == None:
-            return "black"
-        elif agent.influencer:
-            return self.colors["influencer"]
-        elif agent.influenced:
-            return self.colors["influenced"]
-        return self.colors["default"]
+    def placeNodes(self):
+        self.canvas.update_idletasks()
+        (x, y) = layout.findPlacedPositions(self.layoutPositions, [node["size"] for node in self.nodes], self.canvas.winfo_width(), self.canvas.winfo_height())
+        for node in self.nodes:
+            node['x'] = float(x[node["agent"].ID])
+            node['y'] = float(y[node["agent"].ID])
 
     def resizeInterface(self):
         self.updateScreenDimensions()
-        self.destroyCanvas()
-        self.configureCanvas()
         self.window.after(50, self.resizeInterfaceFinish)
 
     def resizeInterfaceFinish(self):
         self.updateSiteDimensions()
-        self.configureGraph()
-    
-    def scale(self, value, minValue, maxValue, scaledMin, scaledMax):
-        if max == min:
-            return (scaledMin + scaledMax) / 2
-        normalized = (value - minValue) / (maxValue - minValue)
-        normalized = max(0.0, min(1.0, normalized))
-        result = scaledMin + normalized * (scaledMax - scaledMin)
-        return max(0.5, round(result, 2))
-    
-    def showLoadingScreen(self):
-        self.loadingLabel = tkinter.Label(self.window, text="Drawing graph, please wait...", font=("Roboto", 14))
-        self.loadingLabel.grid(row=3, column=0, columnspan=self.menuTrayColumns, sticky="nsew")
-        self.canvas.grid_remove() 
-        self.window.update_idletasks()
+        # A drawn graph only has its cached layout rescaled to the new canvas size
+        if self.graphDrawn == True:
+            self.moveGraph()
+        else:
+            self.configureGraph()
 
     def updateLabels(self):
         self.trendemic.updateRuntimeStats()
@@ -428,6 +318,34 @@ class GUI:
         label = self.widgets["statsLabel"]
         label.config(text=statsString)
 
+    def updateLayout(self):
+        if self.stopSimulation == True:
+            return
+        refinedPositions = None
+        while self.layoutUpdates.empty() == False:
+            refinedPositions = self.layoutUpdates.get()
+        if refinedPositions != None:
+            self.layoutPositions = refinedPositions
+            if self.graphDrawn == True:
+                self.moveGraph()
+        # Positions are queued before the thread finishes, so a finished thread with an empty queue has nothing left to apply
+        if self.layoutThread.is_alive() == True or self.layoutUpdates.empty() == False:
+            self.window.after(LAYOUT_UPDATE_INTERVAL, self.updateLayout)
+        else:
+            self.layoutThread = None
+            layout.saveLayout(self.trendemic.findLayoutCachePath(), self.layoutPositions)
+
+    def updateNodeColors(self, agents):
+        for agent in agents:
+            node = self.nodes[agent.ID]
+            # Nodes are not drawn until the graph has been laid out
+            if node == None or "object" not in node:
+                continue
+            fillColor = self.lookupFillColor(agent)
+            if node["color"] != fillColor:
+                self.canvas.itemconfig(node["object"], fill=fillColor)
+            node["color"] = fillColor
+
     def updateScreenDimensions(self):
         self.window.update_idletasks()
         self.screenWidth = self.window.winfo_width()
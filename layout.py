@@ -0,0 +1,217 @@
+import util
+
+import io
+import math
+import numpy
+import os
+
+ATTRACTIVE_FORCE = 0.00005
+FORCE_DIRECTED_DAMPING = 0.88
+FORCE_DIRECTED_LAYOUT_ROUNDS = 75
+GRAPH_BORDER = 90
+INITIAL_RADIUS = 50
+MIN_EDGE_WIDTH = 0.3
+MAX_EDGE_WIDTH = 2.0
+MIN_NODE_SIZE = 8
+MAX_NODE_SIZE = 40
+MIN_AGENTS_EXPECTED = 10
+MAX_AGENTS_EXPECTED = 100
+MAX_STEP = 5
+REPULSIVE_FORCE = 250
+# Graphs up to this many nodes compute repulsion between every pair of nodes
+MAX_EXACT_NODES = 256
+# Upper bound on node pairs held in memory at once when computing nearby repulsion
+MAX_PAIRS = 1 << 20
+# Largest number of grid cells along each axis, bounding the memory used by the cell to cell far field
+MAX_GRID_SIZE = 48
+# Mean number of nodes per grid cell when approximating repulsion on larger graphs
+NODES_PER_CELL = 8
+
+class ForceDirectedLayout:
+    def __init__(self, network, x, y, sizes, minX, minY, maxX, maxY):
+        network.freeze()
+        self.numNodes = network.numNodes
+        self.x = numpy.array(x, dtype=float)
+        self.y = numpy.array(y, dtype=float)
+        self.sizes = numpy.array(sizes, dtype=float)
+        # Nodes are placed by their top left corner, so larger nodes stop closer to the top left bounds
+        self.minX = minX
+        self.minY = minY
+        self.maxX = maxX - self.sizes
+        self.maxY = maxY - self.sizes
+        self.deltaX = numpy.zeros(self.numNodes)
+        self.deltaY = numpy.zeros(self.numNodes)
+        self.repulsiveForce = REPULSIVE_FORCE / self.numNodes if self.numNodes > 0 else 0
+        degrees = numpy.frombuffer(network.degrees, dtype=numpy.int64)
+        self.sources = numpy.repeat(numpy.arange(self.numNodes), degrees)
+        self.targets = numpy.frombuffer(network.targets, dtype=numpy.int64)
+
+    def addRepulsion(self, sources, sinks, midpointsX, midpointsY):
+        dX = midpointsX[sources] - midpointsX[sinks]
+        dY = midpointsY[sources] - midpointsY[sinks]
+        distances = numpy.sqrt(dX**2 + dY**2)
+        # Coincident nodes push each other equally in opposite directions, which cancels out
+        scale = numpy.zeros(len(distances))
+        numpy.divide(2 * self.repulsiveForce, distances * numpy.maximum(distances, 0.01), out=scale, where=distances > 0)
+        self.deltaX += numpy.bincount(sources, weights=dX * scale, minlength=self.numNodes)
+        self.deltaY += numpy.bincount(sources, weights=dY * scale, minlength=self.numNodes)
+
+    def doAttraction(self):
+        (midpointsX, midpointsY) = self.findMidpoints()
+        # Each undirected edge is stored for both endpoints and pulls each of them twice, once as source and once as sink
+        self.deltaX += 2 * ATTRACTIVE_FORCE * numpy.bincount(self.sources, weights=midpointsX[self.targets] - midpointsX[self.sources], minlength=self.numNodes)
+        self.deltaY += 2 * ATTRACTIVE_FORCE * numpy.bincount(self.sources, weights=midpointsY[self.targets] - midpointsY[self.sources], minlength=self.numNodes)
+        self.moveNodes()
+
+    def doForceDirection(self, steps):
+        if self.numNodes == 0:
+            return
+        for i in range(steps):
+            self.doRepulsion()
+            self.doAttraction()
+
+    def doGridRepulsion(self, midpointsX, midpointsY):
+        # Nodes in neighboring grid cells repel exactly, while farther cells repel as one mass at their centroid
+        gridSize = min(max(1, math.ceil(math.sqrt(self.numNodes / NODES_PER_CELL))), MAX_GRID_SIZE)
+        (lowX, lowY) = (midpointsX.min(), midpointsY.min())
+        cellWidth = max(midpointsX.max() - lowX, midpointsY.max() - lowY, 1) / gridSize
+        columns = numpy.minimum(((midpointsX - lowX) / cellWidth).astype(numpy.int64), gridSize - 1)
+        rows = numpy.minimum(((midpointsY - lowY) / cellWidth).astype(numpy.int64), gridSize - 1)
+        cells = rows * gridSize + columns
+        numCells = gridSize * gridSize
+        order = numpy.argsort(cells, kind="stable")
+        counts = numpy.bincount(cells, minlength=numCells)
+        starts = numpy.concatenate(([0], numpy.cumsum(counts)[:-1]))
+
+        # Far field between cells more than one cell apart
+        occupied = numpy.flatnonzero(counts)
+        centroidsX = numpy.bincount(cells, weights=midpointsX, minlength=numCells)[occupied] / counts[occupied]
+        centroidsY = numpy.bincount(cells, weights=midpointsY, minlength=numCells)[occupied] / counts[occupied]
+        dX = centroidsX[:, None] - centroidsX[None, :]
+        dY = centroidsY[:, None] - centroidsY[None, :]
+        (occupiedRows, occupiedColumns) = (occupied // gridSize, occupied % gridSize)
+        far = (numpy.abs(occupiedRows[:, None] - occupiedRows[None, :]) > 1) | (numpy.abs(occupiedColumns[:, None] - occupiedColumns[None, :]) > 1)
+        squaredDistances = numpy.where(far, dX**2 + dY**2, 1)
+        weights = numpy.where(far, 2 * self.repulsiveForce * counts[occupied][None, :] / squaredDistances, 0)
+        cellDeltasX = numpy.zeros(numCells)
+        cellDeltasY = numpy.zeros(numCells)
+        cellDeltasX[occupied] = (dX * weights).sum(axis=1)
+        cellDeltasY[occupied] = (dY * weights).sum(axis=1)
+        self.deltaX = cellDeltasX[cells]
+        self.deltaY = cellDeltasY[cells]
+
+        # Near field between every node and the nodes of its own and the eight surrounding cells
+        for rowOffset in (-1, 0, 1):
+            for columnOffset in (-1, 0, 1):
+                neighborRows = rows + rowOffset
+                neighborColumns = columns + columnOffset
+                valid = (neighborRows >= 0) & (neighborRows < gridSize) & (neighborColumns >= 0) & (neighborColumns < gridSize)
+                sources = numpy.flatnonzero(valid)
+                neighborCells = neighborRows[sources] * gridSize + neighborColumns[sources]
+                pairCounts = counts[neighborCells]
+                pairEnds = numpy.cumsum(pairCounts)
+                chunkStart = 0
+                while chunkStart < len(sources):
+                    # Split sources so no chunk holds many more than the maximum number of pairs
+                    chunkEnd = max(chunkStart + 1, int(numpy.searchsorted(pairEnds, (pairEnds[chunkStart - 1] if chunkStart > 0 else 0) + MAX_PAIRS, side="right")))
+                    chunkCounts = pairCounts[chunkStart:chunkEnd]
+                    total = int(chunkCounts.sum())
+                    if total > 0:
+                        firsts = numpy.repeat(starts[neighborCells[chunkStart:chunkEnd]] - (numpy.cumsum(chunkCounts) - chunkCounts), chunkCounts)
+                        sinks = order[firsts + numpy.arange(total)]
+                        self.addRepulsion(numpy.repeat(sources[chunkStart:chunkEnd], chunkCounts), sinks, midpointsX, midpointsY)
+                    chunkStart = chunkEnd
+
+    def doRepulsion(self):
+        (midpointsX, midpointsY) = self.findMidpoints()
+        if self.numNodes <= MAX_EXACT_NODES:
+            nodes = numpy.arange(self.numNodes)
+            chunkSize = max(1, MAX_PAIRS // self.numNodes)
+            self.deltaX = numpy.zeros(self.numNodes)
+            self.deltaY = numpy.zeros(self.numNodes)
+            for start in range(0, self.numNodes, chunkSize):
+                chunk = nodes[start:start + chunkSize]
+                sinks = numpy.tile(nodes, len(chunk))
+                sources = numpy.repeat(chunk, self.numNodes)
+                self.addRepulsion(sources, sinks, midpointsX, midpointsY)
+        else:
+            self.doGridRepulsion(midpointsX, midpointsY)
+        self.moveNodes()
+
+    def findMidpoints(self):
+        return (self.x + self.sizes / 2, self.y + self.sizes / 2)
+
+    def findNormalizedPositions(self):
+        # Scale each node between its own bounds so the layout can be placed on a canvas of any size
+        normalizedX = numpy.zeros(self.numNodes)
+        normalizedY = numpy.zeros(self.numNodes)
+        numpy.divide(self.x - self.minX, self.maxX - self.minX, out=normalizedX, where=self.maxX > self.minX)
+        numpy.divide(self.y - self.minY, self.maxY - self.minY, out=normalizedY, where=self.maxY > self.minY)
+        return (numpy.clip(normalizedX, 0, 1), numpy.clip(normalizedY, 0, 1))
+
+    def moveNodes(self):
+        self.x += numpy.clip(self.deltaX * FORCE_DIRECTED_DAMPING, -MAX_STEP, MAX_STEP)
+        self.y += numpy.clip(self.deltaY * FORCE_DIRECTED_DAMPING, -MAX_STEP, MAX_STEP)
+        # Bounds are checked lower first, so a node can only end up below its lower bound on a canvas too small to hold it
+        self.x = numpy.where(self.x < self.minX, self.minX, numpy.minimum(self.x, self.maxX))
+        self.y = numpy.where(self.y < self.minY, self.minY, numpy.minimum(self.y, self.maxY))
+
+    def __str__(self):
+        return f"Force Directed Layout: {self.numNodes} nodes, {len(self.targets) // 2} edges"
+
+def findEdgeWidth(numNodes):
+    return scale(numNodes, MIN_AGENTS_EXPECTED, MAX_AGENTS_EXPECTED, MAX_EDGE_WIDTH, MIN_EDGE_WIDTH)
+
+def findInitialPositions(order, centerX, centerY):
+    # Radial dispersion of nodes in the given order to start the force directed layout from
+    x = [0 for node in order]
+    y = [0 for node in order]
+    i = 1
+    for node in order:
+        angle = (2 * math.pi * i) / len(order)
+        x[node] = math.cos(angle) * INITIAL_RADIUS + centerX
+        y[node] = math.sin(angle) * INITIAL_RADIUS + centerY
+        i += 1
+    return (x, y)
+
+def findNodeSizes(network):
+    degrees = [network.degree(node) for node in range(network.numNodes)]
+    if len(degrees) == 0:
+        return []
+    minDegree = min(degrees)
+    maxDegree = max(degrees)
+    return [scale(degree, minDegree, maxDegree, MIN_NODE_SIZE, MAX_NODE_SIZE) for degree in degrees]
+
+def findPlacedPositions(positions, sizes, width, height):
+    # Normalized positions span the room each node has inside the graph border
+    sizes = numpy.array(sizes, dtype=float)
+    x = GRAPH_BORDER + positions[0] * numpy.maximum(width - 2 * GRAPH_BORDER - sizes, 0)
+    y = GRAPH_BORDER + positions[1] * numpy.maximum(height - 2 * GRAPH_BORDER - sizes, 0)
+    return (x, y)
+
+def loadLayout(path, numNodes):
+    if path == None or os.path.exists(path) == False:
+        return None
+    try:
+        positions = numpy.load(path)
+    except:
+        return None
+    if positions.shape != (2, numNodes):
+        return None
+    return (positions[0], positions[1])
+
+def saveLayout(path, positions):
+    if path == None:
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    layoutFile = io.BytesIO()
+    numpy.save(layoutFile, numpy.array(positions))
+    util.writeFileAtomically(path, layoutFile.getvalue())
+
+def scale(value, minValue, maxValue, scaledMin, scaledMax):
+    if maxValue == minValue:
+        return (scaledMin + scaledMax) / 2
+    normalized = (value - minValue) / (maxValue - minValue)
+    normalized = max(0.0, min(1.0, normalized))
+    result = scaledMin + normalized * (scaledMax - scaledMin)
+    return max(0.5, round(result, 2))
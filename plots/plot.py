@@ -1,13 +1,129 @@
+import bisect
 import csv
 import getopt
 import json
 import math
 import matplotlib.pyplot
 import matplotlib.ticker
+import numpy
 import os
 import re
 import sys
 
+# Shared helpers live in the repository root, so import them from there when run as a script
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import util
+
+# Distinct values a quantile sketch keeps exactly before summarizing them
+SKETCH_EXACT_VALUES = 128
+# Largest distance in rank between an estimated and exact quantile, as a fraction of the values in a quantile sketch
+SKETCH_RANK_ERROR = 0.01
+
+# Sidecar file in the dataset directory holding aggregates of logs already parsed
+AGGREGATE_INDEX = "aggregates.index"
+AGGREGATE_INDEX_VERSION = 2
+
+class QuantileSketch:
+    def __init__(self, state=None):
+        # Sorted values, each with the number of ranks it covers and how far its highest possible rank may reach beyond them
+        self.count = 0
+        self.counts = []
+        self.exact = True
+        self.uncertainties = []
+        self.values = []
+        if state != None:
+            (self.count, self.counts, self.exact, self.uncertainties, self.values) = (state["count"], state["counts"], state["exact"], state["uncertainties"], state["values"])
+
+    def add(self, value):
+        self.count += 1
+        if self.exact == False:
+            self.addToSummary(value)
+            return
+        index = bisect.bisect_left(self.values, value)
+        if index < len(self.values) and self.values[index] == value:
+            self.counts[index] += 1
+            return
+        self.values.insert(index, value)
+        self.counts.insert(index, 1)
+        self.uncertainties.insert(index, 0)
+        if len(self.values) > SKETCH_EXACT_VALUES:
+            self.summarize()
+
+    def addToSummary(self, value):
+        # Greenwald-Khanna insertion, where a value between two others inherits the rank uncertainty of its successor
+        index = bisect.bisect_right(self.values, value)
+        uncertainty = 0
+        if index > 0 and index < len(self.values):
+            uncertainty = self.counts[index] + self.uncertainties[index] - 1
+        self.values.insert(index, value)
+        self.counts.insert(index, 1)
+        self.uncertainties.insert(index, uncertainty)
+        if self.count % max(1, int(1 / (2 * SKETCH_RANK_ERROR))) == 0:
+            self.compress()
+
+    def compress(self):
+        # Neighbors merge while the merged value's ranks stay within twice the allowed error, keeping the smallest and largest values exact
+        limit = math.floor(2 * SKETCH_RANK_ERROR * self.count)
+        i = len(self.values) - 2
+        while i >= 1:
+            if self.counts[i] + self.counts[i + 1] + self.uncertainties[i + 1] <= limit:
+                self.counts[i + 1] += self.counts[i]
+                del self.values[i]
+                del self.counts[i]
+                del self.uncertainties[i]
+            i -= 1
+
+    def estimateValueAtRank(self, rank):
+        # Choose the value whose possible ranks lie closest to the requested one, which is always within the allowed error
+        target = rank % self.count + 1
+        bestValue = self.values[0]
+        bestError = None
+        lowestRank = 0
+        for value, count, uncertainty in zip(self.values, self.counts, self.uncertainties):
+            lowestRank += count
+            error = max(target - lowestRank, lowestRank + uncertainty - target)
+            if bestError == None or error < bestError:
+                (bestValue, bestError) = (value, error)
+        return bestValue
+
+    def findState(self):
+        return {"count": self.count, "counts": self.counts, "exact": self.exact, "uncertainties": self.uncertainties, "values": self.values}
+
+    def findValueAtRank(self, rank):
+        # Index into the sorted observations, wrapping negative ranks like a sorted list would
+        rank = rank % self.count
+        for value, count in zip(self.values, self.counts):
+            if rank < count:
+                return value
+            rank -= count
+
+    def quantiles(self):
+        valueAtRank = self.findValueAtRank if self.exact == True else self.estimateValueAtRank
+        columnLength = self.count
+        midpoint = math.floor(columnLength / 2)
+        median = valueAtRank(midpoint)
+        quartile = math.floor(columnLength / 4)
+        firstQuartile = valueAtRank(quartile)
+        thirdQuartile = valueAtRank(midpoint + quartile)
+        if columnLength % 2 == 0:
+            median = round((valueAtRank(midpoint - 1) + median) / 2, 2)
+            firstQuartile = round((valueAtRank(quartile - 1) + firstQuartile) / 2, 2)
+            thirdQuartile = round((valueAtRank((midpoint + quartile) - 1) + thirdQuartile) / 2, 2)
+        return (firstQuartile, median, thirdQuartile)
+
+    def summarize(self):
+        # Repeated values are split so no summarized value covers more ranks than the allowed error permits
+        limit = max(1, math.floor(2 * SKETCH_RANK_ERROR * self.count))
+        (values, counts) = ([], [])
+        for value, count in zip(self.values, self.counts):
+            while count > 0:
+                values.append(value)
+                counts.append(min(count, limit))
+                count -= counts[-1]
+        (self.values, self.counts, self.uncertainties) = (values, counts, [0 for value in values])
+        self.exact = False
+        self.compress()
+
 def findMeans(dataset):
     print(f"Finding mean values across {totalTimesteps} timesteps")
     for sweepKey in dataset:
@@ -23,22 +139,17 @@ def findMedians(dataset):
     for sweepKey in dataset:
         for column in dataset[sweepKey]["metrics"]:
             for i in range(len(dataset[sweepKey]["metrics"][column])):
-                sortedColumn = sorted(dataset[sweepKey]["metrics"][column][i])
-                columnLength = len(sortedColumn)
-                midpoint = math.floor(columnLength / 2)
-                median = sortedColumn[midpoint]
-                quartile = math.floor(columnLength / 4)
-                firstQuartile = sortedColumn[quartile]
-                thirdQuartile = sortedColumn[midpoint + quartile]
-                if columnLength % 2 == 0:
-                    median = round((sortedColumn[midpoint - 1] + median) / 2, 2)
-                    firstQuartile = round((sortedColumn[quartile - 1] + firstQuartile) / 2, 2)
-                    thirdQuartile = round((sortedColumn[(midpoint + quartile) - 1] + thirdQuartile) / 2, 2)
+                sketch = dataset[sweepKey]["metrics"][column][i]
+                if sketch.count == 0:
+                    continue
+                (firstQuartile, median, thirdQuartile) = sketch.quantiles()
                 if column not in dataset[sweepKey]["aggregates"]:
                     dataset[sweepKey]["aggregates"][column] = [0 for j in range(totalTimesteps + 1)]
                     dataset[sweepKey]["firstQuartiles"][column] = [0 for j in range(totalTimesteps + 1)]
                     dataset[sweepKey]["thirdQuartiles"][column] = [0 for j in range(totalTimesteps + 1)]
                 dataset[sweepKey]["aggregates"][column][i] = median
+                dataset[sweepKey]["firstQuartiles"][column][i] = firstQuartile
+                dataset[sweepKey]["thirdQuartiles"][column][i] = thirdQuartile
     return dataset
 
 def findNumberOfDecimals(number):
@@ -85,8 +196,8 @@ def generateSummaryTable(sweepParameter, totalTimesteps, adoptionThreshold, sear
     for sweepKey in dataset:
         agents = dataset[sweepKey]["aggregates"]["agents"][-1]
         influenced = dataset[sweepKey]["aggregates"]["influenced"][-1]
-        if influenced > 0:
-            finalAdoptionFraction = agents / influenced
+        if agents > 0:
+            finalAdoptionFraction = influenced / agents
             sweepRows.append((sweepKey, finalAdoptionFraction))
     sweepRows.sort()
 
@@ -121,35 +232,64 @@ def generateSummaryTable(sweepParameter, totalTimesteps, adoptionThreshold, sear
     else:
         print("No sweep value reached the adoption threshold.")
 
+def loadAggregateIndex(path, totalTimesteps, statistic):
+    index = {"version": AGGREGATE_INDEX_VERSION, "statistic": statistic, "totalTimesteps": totalTimesteps, "files": {}, "sweepKeys": {}}
+    indexPath = path + AGGREGATE_INDEX
+    if os.path.exists(indexPath) == False:
+        return index
+    try:
+        indexFile = open(indexPath)
+        storedIndex = json.loads(indexFile.read())
+        indexFile.close()
+    except:
+        return index
+    # Aggregates only carry over when gathered the same way
+    if storedIndex.get("version") != AGGREGATE_INDEX_VERSION or storedIndex.get("statistic") != statistic or storedIndex.get("totalTimesteps") != totalTimesteps:
+        return index
+    return storedIndex
+
 def parseDataset(path, dataset, totalTimesteps, statistic, skipExtinct=False):
+    index = loadAggregateIndex(path, totalTimesteps, statistic)
     encodedDir = os.fsencode(path)
-    fileCount = 1
-    files = [f for f in os.listdir(encodedDir) if os.fsdecode(f).endswith("json") or os.fsdecode(f).endswith(".csv")]
-    printFileLength = len(max(files, key=len))
-    totalFiles = len(files)
-    for file in files:
+    fileDecisionModel = re.compile(r"^(.+)-(\d+)\.(json|csv|npy)")
+    logs = {}
+    for file in os.listdir(encodedDir):
         filename = os.fsdecode(file)
-        filePath = path + filename
-        fileDecisionModel = re.compile(r"^(.+)-(\d+)\.(json|csv)")
         fileSearch = re.search(fileDecisionModel, filename)
-        if fileSearch == None:
+        if fileSearch == None or not (filename.endswith("json") or filename.endswith(".csv") or filename.endswith(".npy")):
             continue
-        sweepKey = fileSearch.group(1)
+        fileStats = os.stat(path + filename)
+        logs[filename] = {"mtime": fileStats.st_mtime_ns, "size": fileStats.st_size, "sweepKey": fileSearch.group(1)}
+
+    # Running sums and sketches cannot forget a run, so a sweep value with a changed or removed log is rebuilt from its logs
+    staleSweepKeys = set()
+    for filename, indexed in index["files"].items():
+        if filename not in logs or logs[filename] != indexed:
+            staleSweepKeys.add(indexed["sweepKey"])
+    for sweepKey, stored in index["sweepKeys"].items():
+        if sweepKey in staleSweepKeys:
+            continue
+        metrics = stored["metrics"]
+        if statistic == "median":
+            metrics = {column: [QuantileSketch(state) for state in states] for column, states in metrics.items()}
+        dataset[sweepKey] = {"runs": stored["runs"], "timesteps": stored["timesteps"], "aggregates": {}, "firstQuartiles": {}, "thirdQuartiles": {}, "metrics": metrics}
+    files = [filename for filename, log in logs.items() if log["sweepKey"] in staleSweepKeys or index["files"].get(filename) != log]
+    if len(logs) > len(files):
+        print(f"Reusing aggregates of {len(logs) - len(files)} previously parsed logs.")
+
+    fileCount = 1
+    printFileLength = len(max(files, key=len)) if len(files) > 0 else 0
+    totalFiles = len(files)
+    for filename in files:
+        filePath = path + filename
+        sweepKey = logs[filename]["sweepKey"]
         if sweepKey not in dataset:
             dataset[sweepKey] = {"runs": 0, "timesteps": 0, "aggregates": {}, "firstQuartiles": {}, "thirdQuartiles": {}, "metrics": {}}
-        seed = fileSearch.group(2)
-        log = open(filePath)
         printProgress(filename, fileCount, totalFiles, printFileLength)
         fileCount += 1
-        rawData = None
-        if filename.endswith(".json"):
-            rawData = json.loads(log.read())
-        else:
-            rawData = list(csv.DictReader(log))
-
         dataset[sweepKey]["runs"] += 1
         i = 1
-        for item in rawData:
+        for item in readLog(filePath):
             if int(item["timestep"]) > totalTimesteps:
                 break
             if int(item["timestep"]) > dataset[sweepKey]["timesteps"]:
@@ -160,17 +300,21 @@ def parseDataset(path, dataset, totalTimesteps, statistic, skipExtinct=False):
                     if statistic == "mean":
                         dataset[sweepKey]["metrics"][entry] = [0 for j in range(totalTimesteps + 1)]
                     elif statistic == "median":
-                        dataset[sweepKey]["metrics"][entry] = [[] for j in range(totalTimesteps + 1)]
+                        dataset[sweepKey]["metrics"][entry] = [QuantileSketch() for j in range(totalTimesteps + 1)]
                 if item[entry] == "None":
                     item[entry] = 0
+                # Only running sums and fixed size quantile sketches are kept, so memory does not grow with the number of runs
                 if statistic == "mean":
                     dataset[sweepKey]["metrics"][entry][i-1] += float(item[entry])
                 elif statistic == "median":
-                    dataset[sweepKey]["metrics"][entry][i-1].append(float(item[entry]))
+                    dataset[sweepKey]["metrics"][entry][i-1].add(float(item[entry]))
             i += 1
     for sweepKey in dataset:
         if dataset[sweepKey]["runs"] == 0:
             print(f"No simulation runs found for the {sweepKey} sweep value.")
+    if len(files) > 0 or len(logs) != len(index["files"]):
+        index["files"] = logs
+        saveAggregateIndex(path, index, dataset, statistic)
     return dataset
 
 def parseOptions():
@@ -222,6 +366,37 @@ def printProgress(filename, filesParsed, totalFiles, fileLength, decimals=2):
     else:
         print(f"\r{printString}", end='\r')
 
+def readLog(filePath):
+    # Yield log rows one at a time instead of loading whole logs
+    if filePath.endswith(".npy"):
+        # Binary logs are memory mapped typed columns and only need field names attached to each row
+        columns = numpy.load(filePath, mmap_mode="r")
+        for row in columns:
+            yield dict(zip(columns.dtype.names, row.tolist()))
+        return
+    log = open(filePath)
+    if filePath.endswith(".json"):
+        # Simulations write one JSON object per line between the opening and closing brackets of the array
+        for line in log:
+            line = line.strip().rstrip(',')
+            if line == "" or line == "[" or line == "]":
+                continue
+            yield json.loads(line)
+    else:
+        for row in csv.DictReader(log):
+            yield row
+    log.close()
+
+def saveAggregateIndex(path, index, dataset, statistic):
+    index["sweepKeys"] = {}
+    for sweepKey in dataset:
+        metrics = dataset[sweepKey]["metrics"]
+        if statistic == "median":
+            metrics = {column: [sketch.findState() for sketch in sketches] for column, sketches in metrics.items()}
+        index["sweepKeys"][sweepKey] = {"runs": dataset[sweepKey]["runs"], "timesteps": dataset[sweepKey]["timesteps"], "metrics": metrics}
+    # Written atomically so an interrupted run never leaves a partial index behind
+    util.writeFileAtomically(path + AGGREGATE_INDEX, json.dumps(index))
+
 if __name__ == "__main__":
     options = parseOptions()
     path = options["path"]
@@ -0,0 +1,54 @@
+import bisect
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import plot
+
+class QuantileSketchTest(unittest.TestCase):
+    def assertWithinRankError(self, values):
+        sketch = plot.QuantileSketch()
+        for value in values:
+            sketch.add(value)
+        self.assertFalse(sketch.exact)
+        sortedValues = sorted(values)
+        allowedError = plot.SKETCH_RANK_ERROR * len(values)
+        for percentile in range(1, 100):
+            rank = percentile * len(values) // 100
+            estimate = sketch.estimateValueAtRank(rank)
+            # Repeated values hold a run of ranks, any of which the estimate may stand for
+            (lowestRank, highestRank) = (bisect.bisect_left(sortedValues, estimate), bisect.bisect_right(sortedValues, estimate) - 1)
+            self.assertLessEqual(max(lowestRank - rank, rank - highestRank, 0), allowedError)
+        # State saved to the aggregate index restores the same sketch
+        restored = plot.QuantileSketch(sketch.findState())
+        self.assertEqual(restored.quantiles(), sketch.quantiles())
+
+    def testBimodalIntegers(self):
+        generator = random.Random(1)
+        self.assertWithinRankError([generator.randint(0, 100) if generator.random() < 0.51 else generator.randint(7000, 8000) for i in range(5000)])
+
+    def testCascadeShapedAdoption(self):
+        generator = random.Random(2)
+        self.assertWithinRankError([min(1.0, max(0.0, generator.gauss(0.02, 0.02) if generator.random() < 0.5 else generator.gauss(0.97, 0.03))) for i in range(5000)])
+
+    def testExactWithFewDistinctValues(self):
+        generator = random.Random(3)
+        values = [generator.randint(0, 50) / 50 for i in range(1001)]
+        sketch = plot.QuantileSketch()
+        for value in values:
+            sketch.add(value)
+        self.assertTrue(sketch.exact)
+        sortedValues = sorted(values)
+        self.assertEqual(sketch.quantiles(), (sortedValues[250], sortedValues[500], sortedValues[750]))
+
+    def testLognormal(self):
+        generator = random.Random(4)
+        self.assertWithinRankError([generator.lognormvariate(0, 1) for i in range(5000)])
+
+    def testSortedInput(self):
+        self.assertWithinRankError([float(value) for value in range(20000)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import util
+
+import json
+import sys
+import time
+
+class Profiler:
+    def __init__(self):
+        self.counters = {}
+        self.phases = {}
+        self.start = time.perf_counter()
+
+    def addPhaseTime(self, phase, duration):
+        if phase not in self.phases:
+            self.phases[phase] = {"calls": 0, "totalSeconds": 0, "minSeconds": duration, "maxSeconds": duration}
+        stats = self.phases[phase]
+        stats["calls"] += 1
+        stats["totalSeconds"] += duration
+        stats["minSeconds"] = min(stats["minSeconds"], duration)
+        stats["maxSeconds"] = max(stats["maxSeconds"], duration)
+
+    def addToCounter(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def findReport(self, simulation):
+        phases = {}
+        for phase, stats in self.phases.items():
+            phases[phase] = dict(stats)
+            phases[phase]["meanSeconds"] = stats["totalSeconds"] / stats["calls"]
+        return {"counters": dict(self.counters), "phases": phases, "processPeakMemoryBytes": findProcessPeakMemory(), "simulation": simulation, "wallSeconds": time.perf_counter() - self.start}
+
+    def findTimedMethod(self, method, phase):
+        def timedMethod(*args, **kwargs):
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            self.addPhaseTime(phase, time.perf_counter() - start)
+            return result
+        return timedMethod
+
+    def instrument(self, instance, methodNames, prefix=""):
+        # Wrapping methods on the instance leaves the class and every unprofiled simulation untouched
+        for methodName in methodNames:
+            setattr(instance, methodName, self.findTimedMethod(getattr(instance, methodName), prefix + methodName))
+
+    def writeReport(self, path, simulation):
+        if path == None:
+            return
+        report = json.dumps(self.findReport(simulation), indent=4, sort_keys=True)
+        util.writeFileAtomically(path, report + "\n")
+
+    def __str__(self):
+        return f"Profiler: {len(self.phases)} phases, {len(self.counters)} counters"
+
+def findProcessPeakMemory():
+    # Resident set size high-water mark of the whole process, covering every simulation it has run so far
+    try:
+        import resource
+    except:
+        return None
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes while macOS reports bytes
+    return peakMemory if sys.platform == "darwin" else peakMemory * 1024
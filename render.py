@@ -0,0 +1,194 @@
+import graph
+import layout
+
+import numpy
+import random
+import struct
+import zlib
+
+ANIMATION_FRAME_DURATION = 0.1
+BACKGROUND_COLOR = "#FFFFFF"
+DEFAULT_FRAME_HEIGHT = 1000
+DEFAULT_FRAME_WIDTH = 900
+# Edge colors of the interface's color coded network display mode
+LAYER_COLORS = {graph.SCALE_FREE: "#FF0000", graph.SMALL_WORLD: "#0000FF", graph.BOTH: "#A020F0"}
+# Upper bound on edge pixels held in memory at once when rasterizing edges
+MAX_EDGE_PIXELS = 1 << 22
+OUTLINE_COLOR = "#C0C0C0"
+PALETTE = ["#FA3232", "#3232FA", "#32FA32", "#32FAFA", "#FA32FA", "#AA3232", "#3232AA", "#32AA32", "#32AAAA", "#AA32AA", "#FA8800", "#00FA88", "#8800FA", "#FA8888", "#8888FA", "#88FA88", "#FA3288", "#3288FA", "#88FA32", "#AA66AA", "#66AAAA", "#3ED06E", "#6E3ED0", "#D06E3E", "#000000"]
+FILL_COLORS = {"default": PALETTE[0], "influencer": PALETTE[1], "influenced": PALETTE[2]}
+PNG_COMPRESSION_LEVEL = 1
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+class FrameRenderer:
+    def __init__(self, trendemic, width, height, frameFormat):
+        self.trendemic = trendemic
+        self.width = width if width > 0 else DEFAULT_FRAME_WIDTH
+        self.height = height if height > 0 else DEFAULT_FRAME_HEIGHT
+        self.frameFormat = frameFormat
+        self.frame = 0
+        self.fillColors = [findFillColor(agent) for agent in trendemic.agents]
+        self.configureLayout()
+        if self.frameFormat == "png":
+            self.configureRaster()
+        else:
+            self.configureVector()
+
+    def configureLayout(self):
+        network = self.trendemic.graph
+        self.sizes = layout.findNodeSizes(network)
+        cachePath = self.trendemic.findLayoutCachePath()
+        positions = layout.loadLayout(cachePath, network.numNodes)
+        if positions == None:
+            # A private generator shuffles the initial placement so rendering leaves the simulation's random stream untouched
+            order = list(range(network.numNodes))
+            random.Random(self.trendemic.seed).shuffle(order)
+            (x, y) = layout.findInitialPositions(order, self.width / 2, self.height / 2)
+            forceDirectedLayout = layout.ForceDirectedLayout(network, x, y, self.sizes, layout.GRAPH_BORDER, layout.GRAPH_BORDER, self.width - layout.GRAPH_BORDER, self.height - layout.GRAPH_BORDER)
+            forceDirectedLayout.doForceDirection(layout.FORCE_DIRECTED_LAYOUT_ROUNDS)
+            positions = forceDirectedLayout.findNormalizedPositions()
+            layout.saveLayout(cachePath, positions)
+        (self.x, self.y) = layout.findPlacedPositions(positions, self.sizes, self.width, self.height)
+
+    def configureRaster(self):
+        self.pixels = numpy.empty((self.height, self.width, 3), dtype=numpy.uint8)
+        self.pixels[:, :] = findRGB(BACKGROUND_COLOR)
+        # Agent shown at each pixel, so recoloring an agent only touches its own visible pixels
+        self.owners = numpy.full((self.height, self.width), -1, dtype=numpy.int64)
+        self.bounds = []
+        outline = findRGB(OUTLINE_COLOR)
+        # Nodes are drawn in agent order and edges over them, like the interface canvas
+        for node in range(len(self.sizes)):
+            radius = self.sizes[node] / 2
+            (centerX, centerY) = (self.x[node] + radius, self.y[node] + radius)
+            (left, top) = (max(int(centerX - radius), 0), max(int(centerY - radius), 0))
+            (right, bottom) = (min(int(centerX + radius) + 1, self.width), min(int(centerY + radius) + 1, self.height))
+            self.bounds.append((top, bottom, left, right))
+            if left >= right or top >= bottom:
+                continue
+            (rows, columns) = numpy.ogrid[top:bottom, left:right]
+            distances = numpy.sqrt((columns + 0.5 - centerX)**2 + (rows + 0.5 - centerY)**2)
+            inside = distances <= radius
+            interior = distances <= radius - 1
+            self.pixels[top:bottom, left:right][inside] = outline
+            self.owners[top:bottom, left:right][inside] = -1
+            self.pixels[top:bottom, left:right][interior] = findRGB(self.fillColors[node])
+            self.owners[top:bottom, left:right][interior] = node
+        self.drawRasterEdges()
+        self.encodedFrame = None
+
+    def configureVector(self):
+        network = self.trendemic.graph
+        edgeWidth = layout.findEdgeWidth(network.numNodes)
+        self.svgHeader = f"<svg xmlns=\"http://www.w3.org/2000/svg\" xmlns:xlink=\"http://www.w3.org/1999/xlink\" width=\"{self.width}\" height=\"{self.height}\" viewBox=\"0 0 {self.width} {self.height}\">\n<rect width=\"100%\" height=\"100%\" fill=\"{BACKGROUND_COLOR}\"/>\n"
+        self.svgNodes = [self.findSVGNode(node) for node in range(len(self.sizes))]
+        svgEdges = []
+        for source in range(network.numNodes):
+            for (sink, layer) in network.edges(source):
+                # Each undirected edge is stored for both endpoints, so only draw it from the lower ID
+                if sink < source:
+                    continue
+                (sourceX, sourceY) = (self.x[source] + self.sizes[source] / 2, self.y[source] + self.sizes[source] / 2)
+                (sinkX, sinkY) = (self.x[sink] + self.sizes[sink] / 2, self.y[sink] + self.sizes[sink] / 2)
+                svgEdges.append(f"<line x1=\"{sourceX:.2f}\" y1=\"{sourceY:.2f}\" x2=\"{sinkX:.2f}\" y2=\"{sinkY:.2f}\" stroke=\"{LAYER_COLORS[layer]}\" stroke-width=\"{edgeWidth}\"/>\n")
+        self.svgEdges = "".join(svgEdges)
+        self.animation = None
+        if self.frameFormat == "animation":
+            # Later frames only append the color changes of influenced agents to the animation
+            self.animation = open(self.trendemic.findScreenshotPath("screenshots.svg"), 'w')
+            self.animation.write(self.svgHeader + "".join(self.svgNodes) + self.svgEdges)
+
+    def drawRasterEdges(self):
+        network = self.trendemic.graph
+        network.freeze()
+        sources = numpy.repeat(numpy.arange(network.numNodes), numpy.frombuffer(network.degrees, dtype=numpy.int64))
+        sinks = numpy.frombuffer(network.targets, dtype=numpy.int64)
+        layers = numpy.frombuffer(network.layers, dtype=numpy.uint8)
+        drawn = sources < sinks
+        (sources, sinks, layers) = (sources[drawn], sinks[drawn], layers[drawn])
+        sizes = numpy.array(self.sizes, dtype=float)
+        (midpointsX, midpointsY) = (self.x + sizes / 2, self.y + sizes / 2)
+        for (layer, color) in LAYER_COLORS.items():
+            layerEdges = numpy.flatnonzero(layers == layer)
+            (startX, startY) = (midpointsX[sources[layerEdges]], midpointsY[sources[layerEdges]])
+            (endX, endY) = (midpointsX[sinks[layerEdges]], midpointsY[sinks[layerEdges]])
+            # One pixel per step along the longer axis of each edge
+            steps = numpy.ceil(numpy.maximum(numpy.abs(endX - startX), numpy.abs(endY - startY))).astype(numpy.int64) + 1
+            ends = numpy.cumsum(steps)
+            chunkStart = 0
+            while chunkStart < len(layerEdges):
+                chunkEnd = max(chunkStart + 1, int(numpy.searchsorted(ends, (ends[chunkStart - 1] if chunkStart > 0 else 0) + MAX_EDGE_PIXELS, side="right")))
+                chunkSteps = steps[chunkStart:chunkEnd]
+                edges = numpy.repeat(numpy.arange(chunkStart, chunkEnd), chunkSteps)
+                positions = numpy.arange(len(edges)) - numpy.repeat(numpy.cumsum(chunkSteps) - chunkSteps, chunkSteps)
+                fractions = positions / numpy.maximum(steps[edges] - 1, 1)
+                columns = (startX[edges] + (endX[edges] - startX[edges]) * fractions).astype(numpy.int64)
+                rows = (startY[edges] + (endY[edges] - startY[edges]) * fractions).astype(numpy.int64)
+                visible = (columns >= 0) & (columns < self.width) & (rows >= 0) & (rows < self.height)
+                self.pixels[rows[visible], columns[visible]] = findRGB(color)
+                self.owners[rows[visible], columns[visible]] = -1
+                chunkStart = chunkEnd
+
+    def encodePNG(self):
+        rows = numpy.zeros((self.height, 1 + self.width * 3), dtype=numpy.uint8)
+        rows[:, 1:] = self.pixels.reshape(self.height, self.width * 3)
+        header = struct.pack(">IIBBBBB", self.width, self.height, 8, 2, 0, 0, 0)
+        return PNG_SIGNATURE + findPNGChunk(b"IHDR", header) + findPNGChunk(b"IDAT", zlib.compress(rows.tobytes(), PNG_COMPRESSION_LEVEL)) + findPNGChunk(b"IEND", b"")
+
+    def endRendering(self):
+        if self.frameFormat == "animation" and self.animation != None:
+            self.animation.write("</svg>\n")
+            self.animation.close()
+            self.animation = None
+
+    def findSVGNode(self, node):
+        radius = self.sizes[node] / 2
+        return f"<circle id=\"a{node}\" cx=\"{self.x[node] + radius:.2f}\" cy=\"{self.y[node] + radius:.2f}\" r=\"{radius}\" fill=\"{self.fillColors[node]}\" stroke=\"{OUTLINE_COLOR}\"/>\n"
+
+    def renderFrame(self, changedAgents):
+        changedNodes = []
+        for agent in changedAgents:
+            fillColor = findFillColor(agent)
+            if self.fillColors[agent.ID] != fillColor:
+                self.fillColors[agent.ID] = fillColor
+                changedNodes.append(agent.ID)
+        if self.frameFormat == "png":
+            for node in changedNodes:
+                (top, bottom, left, right) = self.bounds[node]
+                owned = self.owners[top:bottom, left:right] == node
+                self.pixels[top:bottom, left:right][owned] = findRGB(self.fillColors[node])
+            # Frames without changes reuse the previous encoding
+            if self.encodedFrame == None or len(changedNodes) > 0:
+                self.encodedFrame = self.encodePNG()
+            frameFile = open(self.trendemic.findScreenshotPath(f"screenshot{self.frame}.png"), "wb")
+            frameFile.write(self.encodedFrame)
+            frameFile.close()
+        elif self.frameFormat == "svg":
+            for node in changedNodes:
+                self.svgNodes[node] = self.findSVGNode(node)
+            frameFile = open(self.trendemic.findScreenshotPath(f"screenshot{self.frame}.svg"), 'w')
+            frameFile.write(self.svgHeader + "".join(self.svgNodes) + self.svgEdges + "</svg>\n")
+            frameFile.close()
+        elif self.animation != None:
+            begin = round(self.frame * ANIMATION_FRAME_DURATION, 6)
+            for node in changedNodes:
+                self.animation.write(f"<set xlink:href=\"#a{node}\" attributeName=\"fill\" to=\"{self.fillColors[node]}\" begin=\"{begin}s\" fill=\"freeze\"/>\n")
+        self.frame += 1
+
+    def __str__(self):
+        return f"Frame Renderer: {self.width}x{self.height} {self.frameFormat}, {self.frame} frames"
+
+def findFillColor(agent, colors=FILL_COLORS):
+    if agent == None:
+        return "black"
+    elif agent.influencer:
+        return colors["influencer"]
+    elif agent.influenced:
+        return colors["influenced"]
+    return colors["default"]
+
+def findPNGChunk(chunkType, data):
+    return struct.pack(">I", len(data)) + chunkType + data + struct.pack(">I", zlib.crc32(chunkType + data) & 0xFFFFFFFF)
+
+def findRGB(color):
+    return (int(color[1:3], 16), int(color[3:5], 16), int(color[5:7], 16))
@@ -1,4 +1,9 @@
+import graph
+
+import heapq
+import math
 import random
+import time
 
 class Strategy:
     def __init__(self, configuration, trendemic):
@@ -8,6 +13,13 @@ class Strategy:
         #local_weight=1.0, global_weight=0.0, heterogeneous_thresholds=False, threshold_distribution="uniform",
         #social_engineer_enabled=False, seeding_strategy=None, social_engineer_count=5
 
+    def findNetworkLayer(self):
+        if "SmallWorld" in self.strategy:
+            return graph.SMALL_WORLD
+        elif "ScaleFree" in self.strategy:
+            return graph.SCALE_FREE
+        return None
+
     # By default, randomize influencer seeding
     def seedAgents(self):
         influenced = 0
@@ -26,46 +38,117 @@ class Strategy:
 class MaxCommunity(Strategy):
     def __init__(self, configuration, trendemic):
         super().__init__(configuration, trendemic)
+        self.cliqueBudget = configuration["communityCliqueBudget"]
+        self.timeBudget = configuration["communityTimeBudget"]
 
-    def bronKerboschCliqueDetection(self, requiredNodes, permittedNodes, excludedNodes, graph, communities):
-        if len(permittedNodes) == 0 and len(excludedNodes) == 0:
-            if len(requiredNodes) > 2:
-                communities.append(sorted(requiredNodes))
-            return
+    def bronKerboschCliqueDetection(self, adjacency):
+        # Iterative Bron-Kerbosch over a degeneracy ordering, so each search starts from at most degeneracy many candidates
+        order = self.findDegeneracyOrder(adjacency)
+        position = [0 for node in order]
+        for i, node in enumerate(order):
+            position[node] = i
+        startTime = time.monotonic()
+        steps = 0
+        for node in order:
+            permittedNodes = set(neighbor for neighbor in adjacency[node] if position[neighbor] > position[node])
+            excludedNodes = adjacency[node].difference(permittedNodes)
+            if len(permittedNodes) == 0:
+                continue
+            stack = [([node], permittedNodes, excludedNodes, self.findPivotCandidates(permittedNodes, excludedNodes, adjacency))]
+            while len(stack) > 0:
+                steps += 1
+                if self.timeBudget != None and steps % 1024 == 0 and time.monotonic() - startTime > self.timeBudget:
+                    return
+                (requiredNodes, permittedNodes, excludedNodes, candidates) = stack[-1]
+                if len(candidates) == 0:
+                    stack.pop()
+                    continue
+                candidate = candidates.pop()
+                neighbors = adjacency[candidate]
+                nextPermittedNodes = permittedNodes.intersection(neighbors)
+                nextExcludedNodes = excludedNodes.intersection(neighbors)
+                permittedNodes.remove(candidate)
+                excludedNodes.add(candidate)
+                if len(nextPermittedNodes) == 0 and len(nextExcludedNodes) == 0:
+                    yield requiredNodes + [candidate]
+                elif len(nextPermittedNodes) > 0:
+                    stack.append((requiredNodes + [candidate], nextPermittedNodes, nextExcludedNodes, self.findPivotCandidates(nextPermittedNodes, nextExcludedNodes, adjacency)))
 
-        (degree, pivotNode) = max([(len(graph[node]), node) for node in permittedNodes.union(excludedNodes)])
-        for node in permittedNodes.difference(graph[pivotNode]):
-            self.bronKerboschCliqueDetection(requiredNodes.union(set([node])), permittedNodes.intersection(graph[node]), excludedNodes.intersection(graph[node]), graph, communities)
-            permittedNodes.remove(node)
-            excludedNodes.add(node)
+    def findDegeneracyOrder(self, adjacency):
+        # Repeatedly remove a node of minimum remaining degree using degree buckets
+        degrees = [len(neighbors) for neighbors in adjacency]
+        buckets = [set() for i in range(max(degrees, default=0) + 1)]
+        for node, degree in enumerate(degrees):
+            buckets[degree].add(node)
+        removed = [False for node in adjacency]
+        order = []
+        minimumDegree = 0
+        for i in range(len(adjacency)):
+            # Removing a node lowers its neighbors' degrees by at most one
+            minimumDegree = max(minimumDegree - 1, 0)
+            while len(buckets[minimumDegree]) == 0:
+                minimumDegree += 1
+            node = buckets[minimumDegree].pop()
+            removed[node] = True
+            order.append(node)
+            for neighbor in adjacency[node]:
+                if removed[neighbor] == False:
+                    buckets[degrees[neighbor]].remove(neighbor)
+                    degrees[neighbor] -= 1
+                    buckets[degrees[neighbor]].add(neighbor)
+        return order
+
+    def findPivotCandidates(self, permittedNodes, excludedNodes, adjacency):
+        # Branching only on nodes outside the neighborhood of the pivot covering most permitted nodes still finds every maximal clique
+        pivotNode = max(permittedNodes.union(excludedNodes), key=lambda node: len(permittedNodes.intersection(adjacency[node])))
+        return list(permittedNodes.difference(adjacency[pivotNode]))
+
+    def sampleCommunities(self, cliques, numSamples):
+        # Each sample is a single item reservoir keeping a clique with probability proportional to its size, matching sampling with replacement
+        samples = [None for i in range(numSamples)]
+        numCommunities = 0
+        totalCommunityDegree = 0
+        for clique in cliques:
+            if len(clique) < 3:
+                continue
+            if self.cliqueBudget != None and numCommunities >= self.cliqueBudget:
+                break
+            numCommunities += 1
+            totalCommunityDegree += len(clique)
+            replacementProbability = len(clique) / totalCommunityDegree
+            if replacementProbability >= 1:
+                samples = [list(clique) for i in range(numSamples)]
+                continue
+            # Skip ahead geometrically to the next reservoir taking this clique instead of drawing once per reservoir
+            index = -1
+            while True:
+                index += 1 + int(math.log(1 - random.random()) / math.log(1 - replacementProbability))
+                if index >= numSamples:
+                    break
+                samples[index] = list(clique)
+        return samples
 
     def seedAgents(self):
-        # Rely on updating the communities by reference in Bron-Kerbosch clique detection
-        communities = []
-        graph = {}
-        for agent in self.trendemic.agents:
-            graph[agent.ID] = set()
-            neighborhood = agent.neighbors
-            if "SmallWorld" in self.strategy:
-                neighborhood = agent.smallWorldNeighbors
-            elif "ScaleFree" in self.strategy:
-                neighborhood = agent.scaleFreeNeighbors
-            for neighbor in neighborhood:
-                graph[agent.ID].add(neighbor.ID)
-        self.bronKerboschCliqueDetection(set(), set(graph.keys()), set(), graph, communities)
-        communityDegrees = [len(community) for community in communities]
-        totalCommunityDegree = sum(communityDegrees)
-        communityWeights = [communityDegree / totalCommunityDegree for communityDegree in communityDegrees]
-        communities = random.choices(communities, weights=communityWeights, k=self.trendemic.numInfluencers)
+        layer = self.findNetworkLayer()
+        adjacency = [set(self.trendemic.graph.neighbors(agent.ID, layer)) for agent in self.trendemic.agents]
+        communities = self.sampleCommunities(self.bronKerboschCliqueDetection(adjacency), self.trendemic.numInfluencers)
+        # Without any community of three or more agents fall back to random seeding
+        if len(communities) == 0 or communities[0] == None:
+            super().seedAgents()
+            return
 
         seededNodes = []
         community = communities.pop()
         random.shuffle(community)
         for i in range(self.trendemic.numInfluencers):
-            if len(community) == 0:
+            while len(community) == 0 and len(communities) > 0:
                 community = communities.pop()
                 community = [node for node in community if node not in seededNodes]
                 random.shuffle(community)
+            if len(community) == 0:
+                # Sampled communities are exhausted, so seed the remaining influencers at random
+                community = [agent.ID for agent in self.trendemic.agents if agent.ID not in seededNodes]
+                random.shuffle(community)
             agentID = community.pop()
             agent = self.trendemic.agents[agentID]
             agent.setInfluencer()
@@ -77,15 +160,143 @@ class MaxDegree(Strategy):
 
     def seedAgents(self):
         maxDegreeAgents = []
+        layer = self.findNetworkLayer()
         for agent in self.trendemic.agents:
-            neighborhood = agent.neighbors
-            if "SmallWorld" in self.strategy:
-                neighborhood = agent.smallWorldNeighbors
-            elif "ScaleFree" in self.strategy:
-                neighborhood = agent.scaleFreeNeighbors
-            maxDegreeAgent = {"agent": agent, "degree": len(neighborhood)}
+            maxDegreeAgent = {"agent": agent, "degree": self.trendemic.graph.degree(agent.ID, layer)}
             maxDegreeAgents.append(maxDegreeAgent)
         maxDegreeAgents.sort(key=lambda agent: agent["degree"], reverse=True)
         for i in range(self.trendemic.numInfluencers):
             agent = maxDegreeAgents[i]["agent"]
             agent.setInfluencer()
+
+class MaxInfluence(Strategy):
+    def __init__(self, configuration, trendemic):
+        super().__init__(configuration, trendemic)
+        # Last cascade found for each agent, which stays exact until the seeds' cascade reaches the agents it examined
+        self.cascades = {}
+
+    def addToCascade(self, cascade):
+        network = self.trendemic.graph
+        for node in cascade:
+            self.influenced[node] = True
+            for edge in range(network.offsets[node], network.offsets[node + 1]):
+                neighbor = network.targets[edge]
+                if network.layers[edge] & graph.SCALE_FREE:
+                    self.scaleFreeCounts[neighbor] += 1
+                if network.layers[edge] & graph.SMALL_WORLD:
+                    self.smallWorldCounts[neighbor] += 1
+
+    def configureCascadeState(self):
+        network = self.trendemic.graph
+        network.freeze()
+        agents = self.trendemic.agents
+        # A zero weight drops a network layer not in use without changing the weighted sum agents compute
+        self.scaleFreeWeights = [agent.scaleFreeWeight if "scaleFree" in self.trendemic.networkTypes else 0 for agent in agents]
+        self.smallWorldWeights = [agent.smallWorldWeight if "smallWorld" in self.trendemic.networkTypes else 0 for agent in agents]
+        self.thresholds = [agent.threshold for agent in agents]
+        self.influenced = [False for agent in agents]
+        self.scaleFreeCounts = [0 for agent in agents]
+        self.smallWorldCounts = [0 for agent in agents]
+        self.cascades = {}
+
+    def crossesThreshold(self, node, scaleFreeCount, smallWorldCount):
+        network = self.trendemic.graph
+        if network.degrees[node] == 0:
+            return False
+        scaleFreeDegree = network.scaleFreeDegrees[node]
+        smallWorldDegree = network.smallWorldDegrees[node]
+        # Sum in the same order as Agent.doInfluence for identical floating point results
+        fractionInfluenced = 0
+        fractionInfluenced += self.smallWorldWeights[node] * (smallWorldCount / smallWorldDegree if smallWorldDegree > 0 else 0)
+        fractionInfluenced += self.scaleFreeWeights[node] * (scaleFreeCount / scaleFreeDegree if scaleFreeDegree > 0 else 0)
+        return fractionInfluenced >= self.thresholds[node]
+
+    def findCascade(self, node):
+        # Influence is monotone, so adding a seed grows the current seeds' settled cascade without replaying it
+        if node in self.cascades:
+            return self.cascades[node]
+        if self.influenced[node] == True:
+            self.cascades[node] = []
+            return []
+        network = self.trendemic.graph
+        cascade = [node]
+        cascadeNodes = set(cascade)
+        scaleFreeCounts = {}
+        smallWorldCounts = {}
+        frontier = cascade
+        while len(frontier) > 0:
+            candidates = set()
+            for influencedNode in frontier:
+                for edge in range(network.offsets[influencedNode], network.offsets[influencedNode + 1]):
+                    neighbor = network.targets[edge]
+                    if self.influenced[neighbor] == True or neighbor in cascadeNodes:
+                        continue
+                    if network.layers[edge] & graph.SCALE_FREE:
+                        scaleFreeCounts[neighbor] = scaleFreeCounts.get(neighbor, self.scaleFreeCounts[neighbor]) + 1
+                    if network.layers[edge] & graph.SMALL_WORLD:
+                        smallWorldCounts[neighbor] = smallWorldCounts.get(neighbor, self.smallWorldCounts[neighbor]) + 1
+                    candidates.add(neighbor)
+            frontier = [candidate for candidate in candidates if self.crossesThreshold(candidate, scaleFreeCounts.get(candidate, self.scaleFreeCounts[candidate]), smallWorldCounts.get(candidate, self.smallWorldCounts[candidate]))]
+            cascade.extend(frontier)
+            cascadeNodes.update(frontier)
+        self.cascades[node] = cascade
+        return cascade
+
+    def findCascadeRegion(self, cascade):
+        # Agents in a cascade and their neighbors, the only agents whose state a cascade reads or changes
+        network = self.trendemic.graph
+        region = set(cascade)
+        for node in cascade:
+            region.update(network.targets[network.offsets[node]:network.offsets[node + 1]])
+        return region
+
+    def seedAgents(self):
+        # Lazy forward greedy selection, keeping cascade sizes as upper bounds and reevaluating only agents a new seed can affect
+        self.configureCascadeState()
+        network = self.trendemic.graph
+        numAgents = len(self.trendemic.agents)
+        bounds = [numAgents for agent in self.trendemic.agents]
+        exact = [False for agent in self.trendemic.agents]
+        seeded = [False for agent in self.trendemic.agents]
+        # Agents whose last cascade read the state of each agent
+        watchers = [[] for agent in self.trendemic.agents]
+        candidates = [(-numAgents, -network.degrees[agent.ID], agent.ID) for agent in self.trendemic.agents]
+        heapq.heapify(candidates)
+        seeds = []
+        while len(seeds) < self.trendemic.numInfluencers and len(candidates) > 0:
+            (bound, degree, node) = heapq.heappop(candidates)
+            # Skip entries superseded by a changed bound
+            if seeded[node] == True or -bound != bounds[node]:
+                continue
+            if exact[node] == False:
+                cascade = self.findCascade(node)
+                bounds[node] = len(cascade)
+                exact[node] = True
+                for readNode in self.findCascadeRegion(cascade):
+                    watchers[readNode].append(node)
+                # Any agent reached by this cascade would only reach a subset of it if seeded instead
+                for reachedNode in cascade[1:]:
+                    if exact[reachedNode] == False and bounds[reachedNode] > len(cascade):
+                        bounds[reachedNode] = len(cascade)
+                        heapq.heappush(candidates, (-len(cascade), -network.degrees[reachedNode], reachedNode))
+                heapq.heappush(candidates, (-len(cascade), degree, node))
+                continue
+
+            cascade = self.findCascade(node)
+            self.addToCascade(cascade)
+            seeds.append(node)
+            seeded[node] = True
+            # Cascades that never read an agent the new seed's cascade changed or borders are still exact
+            affected = set()
+            for readNode in self.findCascadeRegion(cascade):
+                affected.update(watchers[readNode])
+                watchers[readNode] = []
+            for affectedNode in affected:
+                staleCascade = self.cascades.pop(affectedNode, [])
+                for resetNode in [affectedNode] + staleCascade[1:]:
+                    if seeded[resetNode] == False and (exact[resetNode] == True or bounds[resetNode] < numAgents):
+                        exact[resetNode] = False
+                        bounds[resetNode] = numAgents
+                        heapq.heappush(candidates, (-numAgents, -network.degrees[resetNode], resetNode))
+        for agentID in seeds:
+            self.trendemic.agents[agentID].setInfluencer()
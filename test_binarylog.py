@@ -0,0 +1,54 @@
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import binarylog
+import trendemic
+
+class BinaryLogTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createOptions(self, logfile, logfileFormat):
+        return {"logfile": f"{self.path}{logfile}", "logfileFormat": logfileFormat, "networkTypes": ["scaleFree", "smallWorld"],
+                "numAgents": 200, "numInfluencers": 3, "seed": 6, "timesteps": 25}
+
+    def testChunkedRowsReadBack(self):
+        columns = ["agents", "influenced", "timestep"]
+        rows = [{"agents": 10, "influenced": timestep / 3, "timestep": timestep} for timestep in range(10)]
+        # A chunk size that does not divide the row count leaves a partial chunk to flush on close
+        log = binarylog.BinaryLog(f"{self.path}log.npy", columns, chunkRows=3)
+        for row in rows:
+            log.write(row)
+        log.close()
+        loaded = numpy.load(f"{self.path}log.npy")
+        self.assertEqual(list(loaded.dtype.names), columns)
+        self.assertEqual(len(loaded), len(rows))
+        for column in columns:
+            self.assertEqual(loaded[column].tolist(), [float(row[column]) for row in rows])
+
+    def testEmptyLogReadsBack(self):
+        binarylog.BinaryLog(f"{self.path}log.npy", ["timestep"]).close()
+        self.assertEqual(len(numpy.load(f"{self.path}log.npy")), 0)
+
+    def testRunMatchesCSVLog(self):
+        trendemic.runConfiguration(self.createOptions("log.csv", "csv"))
+        trendemic.runConfiguration(self.createOptions("log.npy", "npy"))
+        with open(f"{self.path}log.csv") as logfile:
+            rows = list(csv.DictReader(logfile))
+        loaded = numpy.load(f"{self.path}log.npy")
+        self.assertEqual(len(loaded), len(rows))
+        for column in rows[0]:
+            self.assertEqual(loaded[column].tolist(), [float(row[column]) for row in rows])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import trendemic
+
+class EngineEquivalenceTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createOptions(self, tag, seed, threshold, timesteps, engine="object"):
+        return {"adoptionThreshold": 0.75, "agentScaleFreeSmallWorldRatio": [0.2, 0.2], "agentThreshold": [threshold, threshold],
+                "engine": engine, "logfile": f"{self.path}{tag}-{seed}-{threshold}.csv", "logfileFormat": "csv",
+                "networkTypes": ["scaleFree", "smallWorld"], "numAgents": 300, "numInfluencers": 3, "scaleFreeStartingEdgesPerAgent": 3,
+                "seed": seed, "smallWorldRewiringProbability": 0.2, "timesteps": timesteps}
+
+    def findCases(self):
+        # Different timestep counts let batched simulations finish at different times
+        return [(seed, threshold, timesteps) for seed in (1, 2) for (threshold, timesteps) in ((0.1, 30), (0.2, 20), (0.3, 30))]
+
+    def readLogs(self, tag):
+        logs = {}
+        for (seed, threshold, timesteps) in self.findCases():
+            with open(f"{self.path}{tag}-{seed}-{threshold}.csv") as logfile:
+                logs[(seed, threshold)] = logfile.read()
+        return logs
+
+    def runSingles(self, engine):
+        for (seed, threshold, timesteps) in self.findCases():
+            trendemic.runConfiguration(self.createOptions(engine, seed, threshold, timesteps, engine))
+
+    def testBatchedSeedsMatchObjectEngine(self):
+        self.runSingles("object")
+        for threshold in (0.1, 0.2, 0.3):
+            trendemic.runBatch([self.createOptions("seeds", seed, caseThreshold, timesteps) for (seed, caseThreshold, timesteps) in self.findCases() if caseThreshold == threshold])
+        self.assertEqual(self.readLogs("seeds"), self.readLogs("object"))
+
+    def testBatchedSweepMatchesObjectEngine(self):
+        self.runSingles("object")
+        for seed in (1, 2):
+            trendemic.runBatch([self.createOptions("sweep", caseSeed, threshold, timesteps) for (caseSeed, threshold, timesteps) in self.findCases() if caseSeed == seed])
+        self.assertEqual(self.readLogs("sweep"), self.readLogs("object"))
+
+    def testEnginesMatchObjectEngine(self):
+        self.runSingles("object")
+        logs = self.readLogs("object")
+        # Identical logs across cases would leave nothing for the engines to disagree on
+        self.assertEqual(len(set(logs.values())), len(logs))
+        for engine in ("array", "incremental"):
+            self.runSingles(engine)
+            self.assertEqual(self.readLogs(engine), logs)
+
+if __name__ == "__main__":
+    unittest.main()
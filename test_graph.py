@@ -0,0 +1,63 @@
+import os
+import random
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import graph
+import trendemic
+
+class GraphCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createGraph(self):
+        network = graph.Graph(200)
+        network.addScaleFreeEdges(3, 2, random.Random(1))
+        network.addSmallWorldEdges(3, 0.2, random.Random(2))
+        network.freeze()
+        return network
+
+    def createOptions(self, logfile):
+        return {"graphCache": f"{self.path}graphs", "logfile": f"{self.path}{logfile}", "logfileFormat": "csv", "networkTypes": ["scaleFree", "smallWorld"],
+                "numAgents": 200, "numInfluencers": 3, "seed": 4, "smallWorldRewiringProbability": 0.2, "timesteps": 20}
+
+    def testCachedGraphRunsMatch(self):
+        trendemic.runConfiguration(self.createOptions("miss.csv"))
+        self.assertEqual(len(os.listdir(f"{self.path}graphs")), 1)
+        trendemic.runConfiguration(self.createOptions("hit.csv"))
+        with open(f"{self.path}miss.csv") as missLog, open(f"{self.path}hit.csv") as hitLog:
+            self.assertEqual(hitLog.read(), missLog.read())
+
+    def testRejectsUnsignedFile(self):
+        with open(f"{self.path}bad.graph", "wb") as graphFile:
+            graphFile.write(b"not a graph")
+        self.assertIsNone(graph.loadGraph(f"{self.path}bad.graph"))
+
+    def testSaveLoadRoundTrip(self):
+        network = self.createGraph()
+        network.save(f"{self.path}network.graph")
+        loaded = graph.loadGraph(f"{self.path}network.graph")
+        self.assertEqual(loaded.numNodes, network.numNodes)
+        for data in ("offsets", "targets", "layers", "degrees", "scaleFreeDegrees", "smallWorldDegrees"):
+            self.assertEqual(getattr(loaded, data), getattr(network, data))
+        for node in range(network.numNodes):
+            self.assertEqual(sorted(loaded.edges(node)), sorted(network.edges(node)))
+        self.assertEqual(str(loaded), str(network))
+
+    def testSmallWorldEdgesPreserved(self):
+        network = graph.Graph(2000)
+        network.addSmallWorldEdges(6, 0.3, random.Random(5))
+        network.freeze()
+        self.assertEqual(network.numEdges(graph.SMALL_WORLD), 6000)
+        for node in range(network.numNodes):
+            for neighbor in network.neighbors(node):
+                self.assertTrue(network.hasEdge(neighbor, node))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import csv
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import unittest
+import xml.etree.ElementTree
+import zlib
+
+import numpy
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import render
+import trendemic
+
+class FrameRendererTest(unittest.TestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + '/'
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+
+    def createOptions(self, tag, seed, screenshotFormat):
+        return {"interfaceHeight": 150, "interfaceWidth": 200, "logfile": f"{self.path}{tag}-{seed}.csv", "logfileFormat": "csv", "networkTypes": ["scaleFree", "smallWorld"],
+                "numAgents": 40, "numInfluencers": 2, "screenshotFormat": screenshotFormat, "screenshotPath": f"{self.path}{tag}-{seed}", "screenshots": True, "seed": seed, "timesteps": 6}
+
+    def readFrames(self, tag, seed, extension):
+        frames = []
+        while os.path.exists(f"{self.path}{tag}-{seed}/screenshot{len(frames)}.{extension}"):
+            with open(f"{self.path}{tag}-{seed}/screenshot{len(frames)}.{extension}", "rb") as frameFile:
+                frames.append(frameFile.read())
+        return frames
+
+    def readInfluenced(self, tag, seed):
+        with open(f"{self.path}{tag}-{seed}.csv") as logfile:
+            return [int(row["influenced"]) for row in csv.DictReader(logfile)]
+
+    def readPNG(self, frame):
+        self.assertEqual(frame[:len(render.PNG_SIGNATURE)], render.PNG_SIGNATURE)
+        chunks = {}
+        position = len(render.PNG_SIGNATURE)
+        while position < len(frame):
+            (length, chunkType) = struct.unpack(">I4s", frame[position:position + 8])
+            data = frame[position + 8:position + 8 + length]
+            (crc,) = struct.unpack(">I", frame[position + 8 + length:position + 12 + length])
+            self.assertEqual(crc, zlib.crc32(chunkType + data) & 0xFFFFFFFF)
+            chunks[chunkType] = data
+            position += 12 + length
+        (width, height, bitDepth, colorType) = struct.unpack(">IIBB", chunks[b"IHDR"][:10])
+        self.assertEqual((bitDepth, colorType), (8, 2))
+        self.assertIn(b"IEND", chunks)
+        rows = numpy.frombuffer(zlib.decompress(chunks[b"IDAT"]), dtype=numpy.uint8).reshape(height, 1 + width * 3)
+        # Every scanline uses no filter
+        self.assertTrue((rows[:, 0] == 0).all())
+        return rows[:, 1:].reshape(height, width, 3)
+
+    def testBatchedFramesMatchSingleRuns(self):
+        for seed in (1, 2):
+            trendemic.runConfiguration(self.createOptions("single", seed, "png"))
+        trendemic.runBatch([self.createOptions("batch", seed, "png") for seed in (1, 2)])
+        for seed in (1, 2):
+            self.assertEqual(self.readFrames("batch", seed, "png"), self.readFrames("single", seed, "png"))
+
+    def testPNGFrames(self):
+        trendemic.runConfiguration(self.createOptions("png", 2, "png"))
+        frames = [self.readPNG(frame) for frame in self.readFrames("png", 2, "png")]
+        self.assertEqual(len(frames), 7)
+        influencedColor = render.findRGB(render.FILL_COLORS["influenced"])
+        influencedPixels = [int((frame == influencedColor).all(axis=2).sum()) for frame in frames]
+        for frame in frames:
+            self.assertEqual(frame.shape, (150, 200, 3))
+        # Only influencers are colored before the first timestep, after which influence spreads
+        self.assertEqual(influencedPixels[0], 0)
+        self.assertGreater(influencedPixels[-1], 0)
+        self.assertEqual(influencedPixels, sorted(influencedPixels))
+
+    def testSVGFrames(self):
+        trendemic.runConfiguration(self.createOptions("svg", 2, "svg"))
+        frames = self.readFrames("svg", 2, "svg")
+        self.assertEqual(len(frames), 7)
+        influenced = self.readInfluenced("svg", 2)
+        self.assertGreater(influenced[-1], influenced[0])
+        for (frame, frameInfluenced) in zip(frames, influenced):
+            root = xml.etree.ElementTree.fromstring(frame)
+            self.assertEqual((root.get("width"), root.get("height")), ("200", "150"))
+            fills = [circle.get("fill") for circle in root.iter("{http://www.w3.org/2000/svg}circle")]
+            self.assertEqual(len(fills), 40)
+            # Each frame shows the agents influenced as of the logged timestep it was drawn before
+            self.assertEqual(fills.count(render.FILL_COLORS["influencer"]) + fills.count(render.FILL_COLORS["influenced"]), frameInfluenced)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import graph
+import trendemic
+
+class MaxInfluenceTest(unittest.TestCase):
+    def assertMatchesNaiveGreedy(self, seed, networkTypes, agentThreshold):
+        simulation = self.createSimulation(seed, networkTypes, agentThreshold)
+        seeds = sorted(agent.ID for agent in simulation.agents if agent.influencer == True)
+        self.assertEqual(len(seeds), simulation.numInfluencers)
+        naiveSeeds = self.findNaiveGreedySeeds(simulation)
+        self.assertEqual(seeds, sorted(naiveSeeds))
+        self.assertEqual(self.findCascadeSize(simulation, seeds), self.findCascadeSize(simulation, naiveSeeds))
+
+    def createSimulation(self, seed, networkTypes, agentThreshold):
+        configuration = trendemic.getDefaultConfiguration()
+        configuration.update({"agentScaleFreeSmallWorldRatio": [0.2, 0.8], "agentThreshold": agentThreshold, "networkTypes": networkTypes, "numAgents": 100,
+                              "numInfluencers": 5, "seed": seed, "smallWorldEdgesPerAgent": 4, "smallWorldRewiringProbability": 0.2, "strategy": "maxInfluence"})
+        configuration = trendemic.verifyConfiguration(configuration)
+        random.seed(configuration["seed"])
+        return trendemic.Trendemic(configuration)
+
+    def crossesThreshold(self, simulation, agent, influenced):
+        # Same rule and summation order as Agent.doInfluence
+        network = simulation.graph
+        if network.degree(agent.ID) == 0:
+            return False
+        scaleFreeDegree = network.degree(agent.ID, graph.SCALE_FREE)
+        smallWorldDegree = network.degree(agent.ID, graph.SMALL_WORLD)
+        scaleFreeInfluenced = len([neighbor for neighbor in network.neighbors(agent.ID, graph.SCALE_FREE) if neighbor in influenced])
+        smallWorldInfluenced = len([neighbor for neighbor in network.neighbors(agent.ID, graph.SMALL_WORLD) if neighbor in influenced])
+        fractionInfluenced = 0
+        if "smallWorld" in simulation.networkTypes:
+            fractionInfluenced += agent.smallWorldWeight * (smallWorldInfluenced / smallWorldDegree if smallWorldDegree > 0 else 0)
+        if "scaleFree" in simulation.networkTypes:
+            fractionInfluenced += agent.scaleFreeWeight * (scaleFreeInfluenced / scaleFreeDegree if scaleFreeDegree > 0 else 0)
+        return fractionInfluenced >= agent.threshold
+
+    def findCascadeSize(self, simulation, seeds):
+        # Replay the threshold dynamics from scratch until no agent changes state
+        influenced = set(seeds)
+        while True:
+            newlyInfluenced = [agent.ID for agent in simulation.agents if agent.ID not in influenced and self.crossesThreshold(simulation, agent, influenced)]
+            if len(newlyInfluenced) == 0:
+                return len(influenced)
+            influenced.update(newlyInfluenced)
+
+    def findNaiveGreedySeeds(self, simulation):
+        # Reevaluate every agent's marginal gain each round, breaking ties by higher degree and then lower ID like the lazy selection
+        seeds = []
+        for i in range(simulation.numInfluencers):
+            candidates = [(self.findCascadeSize(simulation, seeds + [agent.ID]), simulation.graph.degree(agent.ID), -agent.ID) for agent in simulation.agents if agent.ID not in seeds]
+            seeds.append(-max(candidates)[2])
+        return seeds
+
+    def testBothNetworks(self):
+        # Thresholds high enough that each new seed adds more than the last without any seed reaching every agent
+        for seed in (1, 2, 3):
+            self.assertMatchesNaiveGreedy(seed, ["scaleFree", "smallWorld"], [0.4, 0.8])
+
+    def testSmallWorldOnly(self):
+        for seed in (4, 5):
+            self.assertMatchesNaiveGreedy(seed, ["smallWorld"], [0.3, 0.7])
+
+if __name__ == "__main__":
+    unittest.main()
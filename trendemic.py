@@ -1,22 +1,25 @@
 #! /usr/bin/python
 
 import agent
+import graph
 import strategy
 
 import getopt
 import hashlib
 import json
 import math
+import os
 import random
 import re
 import sys
 
 class Trendemic:
-    def __init__(self, configuration):
+    def __init__(self, configuration, sharedGraphs=None):
         self.adoptionThreshold = configuration["adoptionThreshold"]
         self.agentConfigHashes = None
         self.configuration = configuration
         self.debug = configuration["debugMode"]
+        self.engineType = configuration["engine"]
         self.keepAlive = configuration["keepAlivePostExtinction"]
         self.logFormat = configuration["logfileFormat"]
         self.maxTimestep = configuration["timesteps"]
@@ -31,22 +34,54 @@ class Trendemic:
         self.agents = []
         # Simulation end flag
         self.end = False
+        self.engine = None
+        # Set once a timestep influences no one, after which no agent can change state
+        self.fixedPoint = False
+        # Agents influenced since the last timestep, whose neighbors are the only ones able to change state
+        self.frontier = []
+        self.frontierScanned = False
+        self.graph = None
         self.log = None
         self.nextAgentID = 0
+        self.profiler = None
+        self.renderer = None
         # Simulation start flag
         self.run = False
+        self.runtimeCounters = None
         self.runtimeStats = {}
+        # Graphs built in this process keyed by topology, letting simulations of the same network share one graph
+        self.sharedGraphs = sharedGraphs
         # TODO: Determine configuration options for seeding strategies
-        self.strategyConfiguration = {"strategy": self.strategy}
+        self.strategyConfiguration = {"communityCliqueBudget": configuration["communityCliqueBudget"], "communityTimeBudget": configuration["communityTimeBudget"], "strategy": self.strategy}
         self.timestep = 0
 
+        if configuration["profileMode"] == True:
+            import profiler
+            self.profiler = profiler.Profiler()
+            self.profiler.instrument(self, ["configureAgents", "configureGraph", "doTimestep", "updateRuntimeStats", "writeToLog"])
         self.configureAgents()
         self.configureGraph()
         self.configureStrategy()
+        self.configureEngine()
         self.gui = gui.GUI(self, self.configuration["interfaceHeight"], self.configuration["interfaceWidth"]) if configuration["headlessMode"] == False else None
+        self.configureRenderer()
 
         self.configureLog()
 
+    def addToRuntimeStats(self, agent, sign=1):
+        if self.runtimeCounters == None:
+            return
+        newlyInfluenced = agent.timestepInfluenced == self.timestep
+        for (group, notInGroup), counters in self.runtimeCounters.items():
+            if group != None and agent.isInGroup(group, notInGroup) == False:
+                continue
+            counters["agents"] += sign
+            if agent.influenced == True:
+                counters["influenced"] += sign
+            if newlyInfluenced == True:
+                counters["newlyInfluenced"] += sign
+                counters["newlyInfluencedDegree"] += sign * self.graph.degree(agent.ID)
+
     def configureAgents(self, editCell=None):
         # Ensure agent endowments are randomized across initial agent count to make replacements follow same distributions
         if len(self.agentEndowments) == 0:
@@ -59,80 +94,24 @@ class Trendemic:
             a = agent.Agent(agentID, self.timestep, agentConfiguration, self)
             self.agents.append(a)
 
+    def configureEngine(self):
+        if self.engineType == "array":
+            import engine
+            self.engine = engine.ArrayEngine(self)
+
     def configureGraph(self):
         if len(self.agents) == 0:
             self.configureAgents()
-        if "scaleFree" in self.networkTypes:
-            nodeDegrees = 0
-            for i in range(self.configuration["scaleFreeHubs"]):
-                for agent in self.agents:
-                    if agent == self.agents[i] or agent in self.agents[i].scaleFreeNeighbors:
-                        continue
-                    self.agents[i].scaleFreeNeighbors.append(agent)
-                    nodeDegrees += 1
-            for j in range(self.configuration["scaleFreeHubs"], len(self.agents)):
-                agent = self.agents[j]
-                potentialNeighbors = self.agents[:]
-                random.shuffle(potentialNeighbors)
-                for k in range(self.configuration["scaleFreeStartingEdgesPerAgent"]):
-                    neighbor = self.agents[k]
-                    if agent == neighbor or neighbor in agent.scaleFreeNeighbors:
-                        continue
-                    agent.scaleFreeNeighbors.append(neighbor)
-                    nodeDegrees += 1
-                for neighbor in potentialNeighbors:
-                    if agent == neighbor or neighbor in agent.scaleFreeNeighbors:
-                        continue
-                    probabilityForNeighboring = len(neighbor.scaleFreeNeighbors) / nodeDegrees
-                    neighboringChance = random.uniform(0.0, 1.0)
-                    if neighboringChance <= probabilityForNeighboring:
-                        agent.scaleFreeNeighbors.append(neighbor)
-                        nodeDegrees += 1
-        if "smallWorld" in self.networkTypes:
-            numNeighborsPerSide = int(self.configuration["smallWorldEdgesPerAgent"] / 2)
-            numNeighborsLeftSide = numNeighborsPerSide
-            numNeighborsRightSide = numNeighborsPerSide
-            if self.configuration["smallWorldEdgesPerAgent"] % 2 != 0:
-                numNeighborsLeftSide = math.floor(numNeighborsPerSide)
-                numNeighborsRightSide = math.ceil(numNeighborsPerSide)
-            for i in range(len(self.agents)):
-                agent = self.agents[i]
-                for j in range(-1 * numNeighborsLeftSide, numNeighborsRightSide + 1):
-                    index = i + j
-                    if index == i:
-                        continue
-                    # Handle positive indices going off the end
-                    if index > len(self.agents) - 1:
-                        index = index % len(self.agents)
-                    rewireChance = random.uniform(0.0, 1.0)
-                    if rewireChance <= self.configuration["smallWorldRewiringProbability"]:
-                        newIndex = random.randrange(0, len(self.agents))
-                        while newIndex == index or newIndex == i:
-                            newIndex = random.randrange(0, len(self.agents))
-                        index = newIndex
-                    neighbor = self.agents[index]
-                    if neighbor == self or neighbor in agent.smallWorldNeighbors:
-                        continue
-                    else:
-                        agent.smallWorldNeighbors.append(neighbor)
-
-        # Double check that all neighbor connections are bi-directional
-        for agent in self.agents:
-            for neighbor in agent.scaleFreeNeighbors:
-                if agent not in neighbor.scaleFreeNeighbors:
-                    neighbor.scaleFreeNeighbors.append(agent)
-            for neighbor in agent.smallWorldNeighbors:
-                if agent not in neighbor.smallWorldNeighbors:
-                    neighbor.smallWorldNeighbors.append(agent)
-            agent.neighbors = list(set(agent.scaleFreeNeighbors + agent.smallWorldNeighbors))
-
-        # After configuring edges, ensure unique list of all neighbors
-        for agent in self.agents:
-            agent.neighbors = list(set(agent.smallWorldNeighbors + agent.scaleFreeNeighbors))
+        graphKey = self.findGraphCacheKey()
+        if self.sharedGraphs != None and graphKey in self.sharedGraphs:
+            self.graph = self.sharedGraphs[graphKey]
+            return
+        self.graph = self.createGraph()
+        if self.sharedGraphs != None:
+            self.sharedGraphs[graphKey] = self.graph
 
     def configureLog(self):
         self.runtimeStats = {"timestep": 0, "adoptionRate": 0, "agents": 0, "influenced": 0, "meanDegreeNewlyInfluenced": 0}
-        self.log = open(self.configuration["logfile"], 'a') if self.configuration["logfile"] != None else None
         self.experimentalGroup = self.configuration["experimentalGroup"]
         if self.experimentalGroup != None:
             # Convert keys to Pythonic case scheme and initialize values
@@ -143,7 +122,31 @@ class Trendemic:
                 groupRuntimeStats[controlGroupKey] = 0
                 groupRuntimeStats[experimentalGroupKey] = 0
             self.runtimeStats.update(groupRuntimeStats)
+        self.configureRuntimeCounters()
         self.updateRuntimeStats()
+        if self.configuration["logfile"] == None:
+            self.log = None
+        elif self.logFormat == "npy":
+            import binarylog
+            # Binary logs have a fixed schema, so columns are set once from the runtime stats
+            self.log = binarylog.BinaryLog(self.configuration["logfile"], sorted(self.runtimeStats))
+        else:
+            self.log = open(self.configuration["logfile"], 'a')
+
+    def configureRenderer(self):
+        # Without an interface canvas to capture, screenshots are rendered directly from the simulation state
+        if self.configuration["screenshots"] == True and self.gui == None:
+            import render
+            self.renderer = render.FrameRenderer(self, self.configuration["interfaceWidth"], self.configuration["interfaceHeight"], self.configuration["screenshotFormat"])
+
+    def configureRuntimeCounters(self):
+        # Count the population once, after which agents report their own state changes
+        self.runtimeCounters = {(None, False): {"agents": 0, "influenced": 0, "newlyInfluenced": 0, "newlyInfluencedDegree": 0}}
+        if self.experimentalGroup != None:
+            for notInGroup in (False, True):
+                self.runtimeCounters[(self.experimentalGroup, notInGroup)] = {"agents": 0, "influenced": 0, "newlyInfluenced": 0, "newlyInfluencedDegree": 0}
+        for agent in self.agents:
+            self.addToRuntimeStats(agent)
 
     def configureStrategy(self):
         if self.strategy == None or self.strategy == "random":
@@ -152,10 +155,68 @@ class Trendemic:
             self.strategy = strategy.MaxDegree(self.strategyConfiguration, self)
         elif "maxCommunity" in self.strategy:
             self.strategy = strategy.MaxCommunity(self.strategyConfiguration, self)
+        elif "maxInfluence" in self.strategy:
+            self.strategy = strategy.MaxInfluence(self.strategyConfiguration, self)
         else:
             self.strategy = strategy.Strategy(self.strategyConfiguration, self)
+        if self.profiler != None:
+            self.profiler.instrument(self.strategy, ["seedAgents"], "configureStrategy.")
         self.strategy.seedAgents()
 
+    def createGraph(self):
+        cachePath = self.findGraphCachePath()
+        if cachePath != None and os.path.exists(cachePath):
+            try:
+                cachedGraph = graph.loadGraph(cachePath)
+            except:
+                cachedGraph = None
+            if cachedGraph != None and cachedGraph.numNodes == len(self.agents):
+                return cachedGraph
+        network = graph.Graph(len(self.agents))
+        if "scaleFree" in self.networkTypes:
+            generator = random.Random(self.findNetworkSeed("scaleFree"))
+            network.addScaleFreeEdges(self.configuration["scaleFreeHubs"], self.configuration["scaleFreeStartingEdgesPerAgent"], generator)
+        if "smallWorld" in self.networkTypes:
+            generator = random.Random(self.findNetworkSeed("smallWorld"))
+            network.addSmallWorldEdges(self.configuration["smallWorldEdgesPerAgent"], self.configuration["smallWorldRewiringProbability"], generator)
+
+        # Edges are stored once per node pair, so every neighbor connection is bi-directional by construction
+        network.freeze()
+        if cachePath != None:
+            os.makedirs(os.path.dirname(cachePath), exist_ok=True)
+            network.save(cachePath)
+        return network
+
+    def doIncrementalTimestep(self, frontier):
+        # Agents with no newly influenced neighbors cannot cross their threshold, so only the frontier neighborhood is reevaluated
+        if self.frontierScanned == False:
+            candidates = self.agents
+            self.frontierScanned = True
+        else:
+            candidates = {}
+            for influenced in frontier:
+                for neighborID in self.graph.neighbors(influenced.ID):
+                    neighbor = self.agents[neighborID]
+                    if neighbor.influenced == False:
+                        candidates[neighborID] = neighbor
+            candidates = candidates.values()
+        for agent in candidates:
+            agent.doTimestep(self.timestep)
+        for agent in candidates:
+            agent.updateInfluence()
+
+    def doInfluence(self, frontier):
+        if self.engine != None:
+            self.engine.doTimestep(self.timestep)
+        elif self.engineType == "incremental":
+            self.doIncrementalTimestep(frontier)
+        else:
+            # Influence is applied synchronously, so the order agents are evaluated in cannot change the outcome
+            for agent in self.agents:
+                agent.doTimestep(self.timestep)
+            for agent in self.agents:
+                agent.updateInfluence()
+
     def doTimestep(self):
         if self.timestep >= self.maxTimestep:
             self.toggleEnd()
@@ -163,16 +224,25 @@ class Trendemic:
         if "all" in self.debug or "trendemic" in self.debug:
             print(f"Timestep: {self.timestep}\nLiving Agents: {len(self.agents)}")
         self.timestep += 1
+        self.resetNewlyInfluencedCounters()
         if self.end == True or (len(self.agents) == 0 and self.keepAlive == False):
             self.toggleEnd()
         else:
-            turnOrder = self.agents.copy()
-            random.shuffle(turnOrder)
-            for agent in turnOrder:
-                agent.doTimestep(self.timestep)
+            frontier = self.frontier
+            self.frontier = []
+            # Once at a fixed point every remaining timestep repeats the frozen state, so only logging is left to do
+            if self.fixedPoint == False:
+                self.doInfluence(frontier)
+            elif self.profiler != None:
+                self.profiler.addToCounter("fixedPointTimesteps")
+            if self.profiler != None:
+                self.profiler.addToCounter("newlyInfluenced", len(self.frontier))
+            # Threshold dynamics are monotone, so a timestep without newly influenced agents is a fixed point
+            if len(self.frontier) == 0 and self.gui == None:
+                self.fixedPoint = True
             self.updateRuntimeStats()
             if self.gui != None:
-                self.gui.doTimestep()
+                self.gui.doTimestep(self.frontier)
             # If final timestep, do not write to log to cleanly close JSON array log structure
             if self.timestep != self.maxTimestep and len(self.agents) > 0:
                 self.writeToLog()
@@ -180,28 +250,88 @@ class Trendemic:
     def endLog(self):
         if self.log == None:
             return
-        # Update total wealth accumulation to include still living agents at simulation end
-        logString = '\t' + json.dumps(self.runtimeStats) + "\n]"
-        if self.logFormat == "csv":
-            logString = ""
-            # Ensure consistent ordering for CSV format
-            for stat in sorted(self.runtimeStats):
-                if logString == "":
-                    logString += f"{self.runtimeStats[stat]}"
-                else:
-                    logString += f",{self.runtimeStats[stat]}"
-            logString += "\n"
-        self.log.write(logString)
-        self.log.flush()
-        self.log.close()
+        if self.logFormat == "npy":
+            self.log.write(self.runtimeStats)
+            self.log.close()
+        else:
+            # Update total wealth accumulation to include still living agents at simulation end
+            logString = '\t' + json.dumps(self.runtimeStats) + "\n]"
+            if self.logFormat == "csv":
+                logString = ""
+                # Ensure consistent ordering for CSV format
+                for stat in sorted(self.runtimeStats):
+                    if logString == "":
+                        logString += f"{self.runtimeStats[stat]}"
+                    else:
+                        logString += f",{self.runtimeStats[stat]}"
+                logString += "\n"
+            self.log.write(logString)
+            self.log.flush()
+            self.log.close()
+        self.writeCompletionRecord()
 
     def endSimulation(self):
+        if self.renderer != None:
+            # Frames are rendered before each timestep, so the final state is rendered once the simulation ends
+            self.renderer.renderFrame(self.frontier)
+            self.renderer.endRendering()
+            self.renderer = None
         self.endLog()
+        if self.engine != None:
+            self.engine.endSimulation(self)
+        if self.profiler != None:
+            simulation = {"agents": len(self.agents), "edges": self.graph.numEdges(), "engine": self.engineType, "logfile": self.configuration["logfile"], "seed": self.seed, "timesteps": self.timestep}
+            self.profiler.writeReport(self.findProfileReportPath(), simulation)
+            self.profiler = None
         if "all" in self.debug or "trendemic" in self.debug:
             for agent in self.agents:
                 print(agent)
             print(str(self))
-        exit(0)
+        # Leave the interface event loop, otherwise return control to the caller running the simulation
+        if self.gui != None:
+            exit(0)
+
+    def findGraphCacheKey(self):
+        # Network topology depends only on the generator version, seed, population size, and options of the network types in use
+        topology = {"generatorVersion": graph.GENERATOR_VERSION, "numAgents": len(self.agents), "networkTypes": sorted(self.networkTypes), "seed": self.seed}
+        if "scaleFree" in self.networkTypes:
+            topology["scaleFreeHubs"] = self.configuration["scaleFreeHubs"]
+            topology["scaleFreeStartingEdgesPerAgent"] = self.configuration["scaleFreeStartingEdgesPerAgent"]
+        if "smallWorld" in self.networkTypes:
+            topology["smallWorldEdgesPerAgent"] = self.configuration["smallWorldEdgesPerAgent"]
+            topology["smallWorldRewiringProbability"] = self.configuration["smallWorldRewiringProbability"]
+        hashed = hashlib.md5(json.dumps(topology, sort_keys=True).encode())
+        return hashed.hexdigest()
+
+    def findGraphCachePath(self):
+        if self.configuration["graphCache"] == None:
+            return None
+        return os.path.join(self.configuration["graphCache"], f"{self.findGraphCacheKey()}.graph")
+
+    def findLayoutCachePath(self):
+        if self.configuration["interfaceLayoutCache"] == None:
+            return None
+        return os.path.join(self.configuration["interfaceLayoutCache"], f"{self.findGraphCacheKey()}.layout")
+
+    def findNetworkSeed(self, networkType):
+        # Give each network layer its own random stream so topology depends only on the seed and network options
+        hashed = hashlib.md5(networkType.encode())
+        return self.seed + int(hashed.hexdigest(), 16)
+
+    def findProfileReportPath(self):
+        if self.configuration["profileReport"] != None:
+            return self.configuration["profileReport"]
+        # Reports default to sitting next to the log they describe
+        if self.configuration["logfile"] != None:
+            return f"{os.path.splitext(self.configuration['logfile'])[0]}.profile"
+        return None
+
+    def findScreenshotPath(self, filename):
+        screenshotPath = self.configuration["screenshotPath"]
+        if screenshotPath == None:
+            return filename
+        os.makedirs(screenshotPath, exist_ok=True)
+        return os.path.join(screenshotPath, filename)
 
     def generateAgentID(self):
         agentID = self.nextAgentID
@@ -275,6 +405,21 @@ class Trendemic:
             endowments.append(agentEndowment)
         return endowments
 
+    def recordInfluenced(self, agent):
+        self.frontier.append(agent)
+        self.addToRuntimeStats(agent)
+
+    def removeFromRuntimeStats(self, agent):
+        self.addToRuntimeStats(agent, -1)
+
+    def resetNewlyInfluencedCounters(self):
+        # No agent has been influenced in a timestep that just began
+        if self.runtimeCounters == None:
+            return
+        for counters in self.runtimeCounters.values():
+            counters["newlyInfluenced"] = 0
+            counters["newlyInfluencedDegree"] = 0
+
     def runSimulation(self, timesteps=5):
         self.startLog()
         if self.log == None:
@@ -290,8 +435,10 @@ class Trendemic:
             if len(self.agents) == 0 and self.keepAlive == False:
                 break
             if self.configuration["screenshots"] == True and self.configuration["headlessMode"] == False:
-                self.gui.canvas.postscript(file=f"screenshot{screenshots}.ps", colormode="color")
+                self.gui.canvas.postscript(file=self.findScreenshotPath(f"screenshot{screenshots}.ps"), colormode="color")
                 screenshots += 1
+            elif self.renderer != None:
+                self.renderer.renderFrame(self.frontier)
             self.doTimestep()
             t += 1
             if self.gui != None and self.run == False:
@@ -311,7 +458,7 @@ class Trendemic:
                     header += f",{stat}"
             header += "\n"
             self.log.write(header)
-        else:
+        elif self.logFormat == "json":
             self.log.write("[\n")
         self.updateRuntimeStats()
         self.writeToLog()
@@ -330,22 +477,12 @@ class Trendemic:
         self.updateRuntimeStatsPerGroup()
 
     def updateRuntimeStatsPerGroup(self, group=None, notInGroup=False):
-        numInfluenced = 0
-        meanDegreeNewlyInfluenced = 0
-        newlyInfluenced = 0
-        numAgents = 0
-        for agent in self.agents:
-            if group != None and agent.isInGroup(group, notInGroup) == False:
-                continue
-            numAgents += 1
-            if agent.timestepInfluenced == self.timestep:
-                newlyInfluenced += 1
-                meanDegreeNewlyInfluenced += len(agent.neighbors)
-            if agent.influenced == True:
-                numInfluenced += 1
-
+        # Counters are kept current by agent state changes, so stats cost nothing per agent here
+        counters = self.runtimeCounters[(group, notInGroup)]
+        numAgents = counters["agents"]
+        numInfluenced = counters["influenced"]
         adoptionRate = numInfluenced / numAgents if numAgents != 0 else 0
-        meanDegreeNewlyInfluenced = meanDegreeNewlyInfluenced / numAgents if numAgents != 0 else 0
+        meanDegreeNewlyInfluenced = counters["newlyInfluencedDegree"] / numAgents if numAgents != 0 else 0
 
         runtimeStats = {"adoptionRate": adoptionRate, "agents": numAgents, "influenced": numInfluenced, "meanDegreeNewlyInfluenced": meanDegreeNewlyInfluenced}
 
@@ -359,17 +496,25 @@ class Trendemic:
                 groupKey = groupString + key[0].upper() + key[1:]
                 groupStats[groupKey] = runtimeStats[key]
             runtimeStats = groupStats
-            if notInGroup == True:
-                runtimeStats.update(controlInteractionStats)
-            else:
-                runtimeStats.update(experimentalInteractionStats)
 
         for key in runtimeStats.keys():
             self.runtimeStats[key] = runtimeStats[key]
 
+    def writeCompletionRecord(self):
+        if self.configuration["completionManifest"] == None:
+            return
+        record = {"logfile": self.configuration["logfile"], "seed": self.seed, "timestep": self.timestep, "agents": len(self.agents)}
+        # A single short appended line is written in one call, so concurrent simulations sharing a manifest never interleave records
+        manifest = open(self.configuration["completionManifest"], 'a')
+        manifest.write(json.dumps(record) + "\n")
+        manifest.close()
+
     def writeToLog(self):
         if self.log == None:
             return
+        if self.logFormat == "npy":
+            self.log.write(self.runtimeStats)
+            return
         logString = '\t' + json.dumps(self.runtimeStats) + ",\n"
         if self.logFormat == "csv":
             logString = ""
@@ -386,6 +531,48 @@ class Trendemic:
         string = f"Seed: {self.seed}\nTimestep: {self.timestep}\nLiving Agents: {len(self.agents)}"
         return string
 
+def getDefaultConfiguration():
+    # Set default values for simulation configuration
+    configuration = {
+                     "adoptionThreshold": 1.0,
+                     "agentScaleFreeSmallWorldRatio": [0.5, 0.5],
+                     "agentSmallWorldWeight": [1.0, 1.0],
+                     "agentThreshold": [0.2, 0.2],
+                     "communityCliqueBudget": None,
+                     "communityTimeBudget": None,
+                     "completionManifest": None,
+                     "debugMode": ["none"],
+                     "engine": "object",
+                     "experimentalGroup": None,
+                     "graphCache": None,
+                     "headlessMode": True,
+                     "influenceBehaviorModel": ["inky"],
+                     "interfaceHeight": 1000,
+                     "interfaceLayoutCache": None,
+                     "interfaceWidth": 900,
+                     "keepAliveAtEnd": False,
+                     "keepAlivePostExtinction": False,
+                     "logfile": None,
+                     "logfileFormat": "json",
+                     "networkTypes": ["smallWorld"],
+                     "numAgents": 10,
+                     "numInfluencers": 1,
+                     "profileMode": False,
+                     "profileReport": None,
+                     "scaleFreeHubs": 3,
+                     "scaleFreeStartingEdgesPerAgent": 2,
+                     "screenshotFormat": "png",
+                     "screenshotPath": None,
+                     "screenshots": False,
+                     "seed": -1,
+                     "smallWorldEdgesPerAgent": 2,
+                     "smallWorldRewiringProbability": 0.0,
+                     "strategy": None,
+                     "threshold": 0.2,
+                     "timesteps": 200
+                     }
+    return configuration
+
 def parseConfiguration(configFile, configuration):
     file = open(configFile)
     options = json.loads(file.read())
@@ -430,6 +617,60 @@ def printHelp():
     print("Usage:\n\tpython trendemic.py --conf config.json\n\nOptions:\n\t-c,--conf\tUse specified config file for simulation settings.\n\t-h,--help\tDisplay this message.")
     exit(0)
 
+def runBatch(optionsList):
+    # Run several headless simulations in the calling process, advancing them together through one batched engine
+    simulations = []
+    sharedGraphs = {}
+    for options in optionsList:
+        configuration = getDefaultConfiguration()
+        for opt in configuration:
+            if opt in options:
+                configuration[opt] = options[opt]
+        configuration = verifyConfiguration(configuration)
+        # Batched simulations share one engine, so they cannot be driven by an interface or their own engine
+        configuration["engine"] = "object"
+        configuration["headlessMode"] = True
+        random.seed(configuration["seed"])
+        simulations.append(Trendemic(configuration, sharedGraphs))
+    import engine
+    engine.BatchEngine(simulations)
+
+    for simulation in simulations:
+        simulation.startLog()
+        if simulation.log == None:
+            simulation.updateRuntimeStats()
+    t = 1
+    running = simulations
+    while len(running) > 0:
+        stillRunning = []
+        for simulation in running:
+            if t > simulation.maxTimestep or (len(simulation.agents) == 0 and simulation.keepAlive == False):
+                # Simulations end as soon as they finish so the batch stops advancing them
+                simulation.endSimulation()
+                continue
+            if simulation.renderer != None:
+                simulation.renderer.renderFrame(simulation.frontier)
+            simulation.doTimestep()
+            stillRunning.append(simulation)
+        running = stillRunning
+        t += 1
+    return [dict(simulation.runtimeStats) for simulation in simulations]
+
+def runConfiguration(options):
+    # Run one simulation in the calling process and return its final runtime stats
+    configuration = getDefaultConfiguration()
+    for opt in configuration:
+        if opt in options:
+            configuration[opt] = options[opt]
+    configuration = verifyConfiguration(configuration)
+    if configuration["headlessMode"] == False:
+        global gui
+        import gui
+    random.seed(configuration["seed"])
+    T = Trendemic(configuration)
+    T.runSimulation(configuration["timesteps"])
+    return dict(T.runtimeStats)
+
 def sortConfigurationTimeframes(configuration, timeframe):
     config = configuration[timeframe]
     if configuration != [0, 0]:
@@ -501,9 +742,39 @@ def verifyConfiguration(configuration):
     if configuration["logfile"] == "":
         configuration["logfile"] = None
 
+    if configuration["completionManifest"] == "":
+        configuration["completionManifest"] = None
+
+    if configuration["graphCache"] == "":
+        configuration["graphCache"] = None
+
+    if configuration["interfaceLayoutCache"] == "":
+        configuration["interfaceLayoutCache"] = None
+
+    if configuration["profileReport"] == "":
+        configuration["profileReport"] = None
+
+    if configuration["screenshotPath"] == "":
+        configuration["screenshotPath"] = None
+
     if configuration["seed"] == -1:
         configuration["seed"] = random.randrange(sys.maxsize)
 
+    recognizedEngines = ["array", "incremental", "object"]
+    if configuration["engine"] not in recognizedEngines:
+        print(f"Engine {configuration['engine']} not recognized")
+        printHelp()
+
+    recognizedLogfileFormats = ["csv", "json", "npy"]
+    if configuration["logfileFormat"] not in recognizedLogfileFormats:
+        print(f"Logfile format {configuration['logfileFormat']} not recognized")
+        printHelp()
+
+    recognizedScreenshotFormats = ["animation", "png", "svg"]
+    if configuration["screenshotFormat"] not in recognizedScreenshotFormats:
+        print(f"Screenshot format {configuration['screenshotFormat']} not recognized")
+        printHelp()
+
     recognizedDebugModes = ["agent", "all", "behavior", "none", "trendemic"]
     validModes = True
     for mode in configuration["debugMode"]:
@@ -532,52 +803,12 @@ def verifyConfiguration(configuration):
     return configuration
 
 if __name__ == "__main__":
-    # Set default values for simulation configuration
-    configuration = {
-                     "adoptionThreshold": 1.0,
-                     "agentScaleFreeSmallWorldRatio": [0.5, 0.5],
-                     "agentSmallWorldWeight": [1.0, 1.0],
-                     "agentThreshold": [0.2, 0.2],
-                     "debugMode": ["none"],
-                     "experimentalGroup": None,
-                     "headlessMode": True,
-                     "influenceBehaviorModel": ["inky"],
-                     "interfaceHeight": 1000,
-                     "interfaceWidth": 900,
-                     "keepAliveAtEnd": False,
-                     "keepAlivePostExtinction": False,
-                     "logfile": None,
-                     "logfileFormat": "json",
-                     "networkTypes": ["smallWorld"],
-                     "numAgents": 10,
-                     "numInfluencers": 1,
-                     "profileMode": False,
-                     "scaleFreeHubs": 3,
-                     "scaleFreeStartingEdgesPerAgent": 2,
-                     "screenshots": False,
-                     "seed": -1,
-                     "smallWorldEdgesPerAgent": 2,
-                     "smallWorldRewiringProbability": 0.0,
-                     "strategy": None,
-                     "threshold": 0.2,
-                     "timesteps": 200
-                     }
-
+    configuration = getDefaultConfiguration()
     configuration = parseOptions(configuration)
     configuration = verifyConfiguration(configuration)
     if configuration["headlessMode"] == False:
         import gui
     random.seed(configuration["seed"])
     T = Trendemic(configuration)
-    if configuration["profileMode"] == True:
-        import cProfile
-        import tracemalloc
-        tracemalloc.start()
-        cProfile.run("T.runSimulation(configuration[\"timesteps\"])")
-        snapshot = tracemalloc.take_snapshot()
-        memoryStats = snapshot.statistics("lineno", True)
-        for stat in memoryStats[:100]:
-            print(stat)
-    else:
-        T.runSimulation(configuration["timesteps"])
+    T.runSimulation(configuration["timesteps"])
     exit(0)
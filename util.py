@@ -0,0 +1,9 @@
+import os
+
+def writeFileAtomically(path, contents):
+    # Write to a temporary file first so concurrent readers and writers sharing the path never see a partial file
+    temporaryPath = f"{path}.{os.getpid()}.tmp"
+    outputFile = open(temporaryPath, "wb" if type(contents) == bytes else 'w')
+    outputFile.write(contents)
+    outputFile.close()
+    os.replace(temporaryPath, path)